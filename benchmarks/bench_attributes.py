@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the user attribute codecs of alexa/attribute_codecs.py on synthetic attribute sets:
+size of the stored attributes, as DynamoDB counts it, the capacity units of a read and of a full write,
+and the encode/decode cost of every codec.
+
+Usage: python benchmarks/bench_attributes.py [--number N] [--threshold BYTES]
+"""
+import argparse
+import math
+import os
+import random
+import string
+import sys
+import timeit
+from decimal import Decimal
+
+SKILL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lambda', 'py')
+sys.path.insert(0, SKILL_DIR)
+
+from alexa.attribute_codecs import PlainCodec, BinaryCodec, item_size  # noqa: E402
+
+
+def word(length=8):
+    return ''.join(random.choice(string.ascii_lowercase) for _ in range(length))
+
+
+def attribute_sets():
+    """ Small, medium and large user states, with numbers as DynamoDB returns them """
+    random.seed(7)
+    small = {"first_use": False, "launch_count": Decimal(12), "last_intent": "AMAZON.HelpIntent", "locale": "it-IT"}
+    medium = dict(small, favourites=[word() for _ in range(20)],
+                  scores={word(): Decimal(random.randint(0, 1000)) for _ in range(30)},
+                  settings={"voice": "default", "volume": Decimal("0.8"), "notifications": True})
+    large = dict(medium, history=[{"intent": random.choice(["CityIntent", "HelpIntent", "PlayIntent"]),
+                                   "slot": word(), "timestamp": Decimal(1700000000 + i * 60)} for i in range(300)])
+    return {"small": small, "medium": medium, "large": large}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=2000, help="encode/decode calls timed")
+    parser.add_argument("--threshold", type=int, default=512, help="compression threshold of the binary codec")
+    args = parser.parse_args()
+
+    codecs = [("plain", PlainCodec()), ("binary", BinaryCodec(compress_threshold=args.threshold))]
+    print("{:<8} {:<18} {:>10} {:>6} {:>6} {:>12} {:>12}".format(
+        "set", "codec", "bytes", "RCU", "WCU", "encode us", "decode us"))
+    for set_name, attributes in attribute_sets().items():
+        for codec_name, codec in codecs:
+            encoded = codec.encode(attributes)
+            size = item_size(encoded)
+            encode = timeit.timeit(lambda: codec.encode(attributes), number=args.number) / args.number
+            decode = timeit.timeit(lambda: codec.decode(encoded), number=args.number) / args.number
+            print("{:<8} {:<18} {:>10} {:>6} {:>6} {:>12.1f} {:>12.1f}".format(
+                set_name, codec_name, size, int(math.ceil(size / 4096.0)), int(math.ceil(size / 1024.0)),
+                encode * 1e6, decode * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark of the per-request translation setup done by the LocalizationInterceptor.
+It compares the old gettext.translation call, that searches the .mo files on disk for every request,
+with the catalog cache in alexa/localization.py.
+
+Usage: python benchmarks/bench_localization.py [--number N]
+"""
+import argparse
+import gettext
+import os
+import sys
+import timeit
+
+SKILL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lambda', 'py')
+sys.path.insert(0, SKILL_DIR)
+
+from alexa import localization  # noqa: E402
+
+LOCALES = ["en-GB", "en-US", "it-IT", "de-DE"]
+
+
+def per_request_translation():
+    """ What LocalizationInterceptor did before: a catalog lookup on disk for every request """
+    for locale in LOCALES:
+        i18n = gettext.translation('data', localedir=localization.LOCALE_DIR, languages=[locale], fallback=True)
+        i18n.gettext("WELCOME")
+
+
+def cached_translation():
+    for locale in LOCALES:
+        localization.get_translator(locale)("WELCOME")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=2000, help="requests simulated per locale")
+    args = parser.parse_args()
+
+    print("Compiled catalogs found: {}".format(localization.preload_catalogs() or "none"))
+    results = []
+    for name, func in (("gettext.translation per request", per_request_translation),
+                       ("cached catalogs", cached_translation)):
+        seconds = min(timeit.repeat(func, number=args.number, repeat=3))
+        per_request = seconds / (args.number * len(LOCALES)) * 1e6
+        results.append(per_request)
+        print("{:<35} {:>10.2f} us/request".format(name, per_request))
+    print("Speedup: {:.1f}x".format(results[0] / results[1]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the SSML to card text conversion done by the AddCardInterceptor.
+It compares the previous html.parser based SSMLStripper with alexa.utils.convert_speech_to_text,
+both without memoization (every string seen for the first time) and with it (repeated prompts),
+over the prompts of the locales catalogs plus a set of typical SSML responses.
+
+Usage: python benchmarks/bench_ssml.py [--number N]
+"""
+import argparse
+import glob
+import os
+import sys
+import timeit
+from html.parser import HTMLParser
+
+SKILL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lambda', 'py')
+sys.path.insert(0, SKILL_DIR)
+
+from alexa.utils import convert_speech_to_text  # noqa: E402
+
+SSML_PROMPTS = [
+    "<speak>Welcome to <lang xml:lang='en-US'>Skill Name</lang>! How can I help?</speak>",
+    "<speak>Sorry, I didn't get that.<break time='500ms'/>You can say help, or stop.</speak>",
+    "<speak><p>Here is your summary.</p><p>You have <say-as interpret-as='cardinal'>3</say-as> new items.</p></speak>",
+    "<speak>Your appointment is on <say-as interpret-as='date' format='dm'>12-10</say-as> "
+    "at <say-as interpret-as='time'>9:30am</say-as>.</speak>",
+    "<speak>The <sub alias='World Wide Web Consortium'>W3C</sub> publishes the SSML standard.</speak>",
+    "<speak><s>Tom &amp; Jerry</s><s>are &quot;friends&quot;.</s></speak>",
+    "<speak><amazon:effect name='whispered'>This is a secret.</amazon:effect> Goodbye!</speak>",
+    "<speak><audio src='https://example.com/sound.mp3'/>And the winner is <emphasis level='strong'>you</emphasis>!"
+    "</speak>",
+    "<speak>Ok, goodbye.</speak>",
+]
+
+
+class SSMLStripper(HTMLParser):
+    """ The previous implementation, a new html.parser instance for every conversion """
+
+    def error(self, message):
+        raise NotImplementedError
+
+    def __init__(self):
+        super().__init__()
+        self.reset()
+        self.full_str_list = []
+        self.strict = False
+        self.convert_charrefs = True
+
+    def handle_data(self, d):
+        self.full_str_list.append(d)
+
+    def get_data(self):
+        return ''.join(self.full_str_list)
+
+
+def html_parser_conversion(ssml_speech):
+    s = SSMLStripper()
+    s.feed(ssml_speech)
+    return s.get_data()
+
+
+def catalog_prompts():
+    """ Every translated message of the .po files, as the speech built by the response builder """
+    prompts = []
+    for po_file in glob.glob(os.path.join(SKILL_DIR, 'locales', '*', 'LC_MESSAGES', '*.po')):
+        with open(po_file, encoding='utf-8') as fp:
+            message, in_msgstr = [], False
+            for line in fp:
+                line = line.strip()
+                if line.startswith('msgstr '):
+                    in_msgstr, message = True, [line[len('msgstr '):]]
+                elif in_msgstr and line.startswith('"'):
+                    message.append(line)
+                elif in_msgstr:
+                    text = ''.join(part.strip('"') for part in message).replace('\\n', '\n')
+                    if text:
+                        prompts.append("<speak>{}</speak>".format(text))
+                    in_msgstr = False
+    return prompts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=500, help="passes over the corpus")
+    args = parser.parse_args()
+
+    corpus = catalog_prompts() + SSML_PROMPTS
+    uncached = convert_speech_to_text.__wrapped__
+    mismatches = [p for p in corpus if uncached(p) != html_parser_conversion(p).strip()]
+    print("Corpus: {} prompts, {} converted differently from html.parser "
+          "(<sub>, <break>, <p>, <s> handling)".format(len(corpus), len(mismatches)))
+
+    def run(func):
+        return lambda: [func(prompt) for prompt in corpus]
+
+    results = []
+    for name, func in (("html.parser SSMLStripper", html_parser_conversion),
+                       ("single-pass tokenizer", uncached),
+                       ("single-pass tokenizer, memoized", convert_speech_to_text)):
+        seconds = min(timeit.repeat(run(func), number=args.number, repeat=3))
+        conversions = args.number * len(corpus)
+        results.append(seconds)
+        print("{:<35} {:>12.0f} conversions/s {:>8.2f} us/conversion".format(
+            name, conversions / seconds, seconds / conversions * 1e6))
+    print("Speedup: {:.1f}x uncached, {:.1f}x memoized".format(results[0] / results[1], results[0] / results[2]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+In-memory stand-in for the boto3 DynamoDB resource, used by the offline benchmarks.
+It implements the subset of the Table and resource API used by the skill (get_item, put_item, update_item,
+batch_write_item) with the SET, ADD and REMOVE expressions the skill builds, and can add a fixed or random latency
+to every call.
+"""
+import copy
+import random
+import re
+import threading
+import time
+from decimal import Decimal
+from botocore.exceptions import ClientError
+
+
+def _conditional_check_failed(operation):
+    return ClientError({"Error": {"Code": "ConditionalCheckFailedException",
+                                  "Message": "The conditional request failed"}}, operation)
+
+
+def _to_dynamo(value):
+    """ Numbers are returned as Decimal, as DynamoDB does """
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float)):
+        return Decimal(str(value))
+    if isinstance(value, dict):
+        return {k: _to_dynamo(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_to_dynamo(v) for v in value]
+    return value
+
+
+class FakeTable(object):
+    def __init__(self, resource, name):
+        self.resource = resource
+        self.name = name
+
+    @property
+    def items(self):
+        return self.resource.tables.setdefault(self.name, {})
+
+    def _key(self, key):
+        return tuple(sorted(key.items()))
+
+    def _path(self, path, names):
+        return [names.get(part, part) for part in path.strip().split(".")]
+
+    def _get(self, item, parts):
+        for part in parts:
+            if not isinstance(item, dict) or part not in item:
+                return None
+            item = item[part]
+        return item
+
+    def _check(self, item, condition, names, values, operation):
+        if not condition:
+            return
+        results = []
+        for clause in re.split(r"\s+(?:OR|AND)\s+", condition):
+            clause = clause.strip()
+            match = re.match(r"attribute_(not_)?exists\((.+)\)$", clause)
+            if match:
+                exists = item is not None and self._get(item, self._path(match.group(2), names)) is not None
+                results.append(exists != bool(match.group(1)))
+                continue
+            left, right = [side.strip() for side in clause.split("=")]
+            results.append(item is not None and self._get(item, self._path(left, names)) == values[right])
+        satisfied = any(results) if " OR " in condition else all(results)
+        if not satisfied:
+            raise _conditional_check_failed(operation)
+
+    def get_item(self, Key, ConsistentRead=False, **kwargs):
+        self.resource.call("GetItem")
+        with self.resource.lock:
+            item = self.items.get(self._key(Key))
+            return {"Item": copy.deepcopy(item)} if item is not None else {}
+
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeNames=None,
+                 ExpressionAttributeValues=None, **kwargs):
+        self.resource.call("PutItem")
+        key = self._key({name: Item[name] for name in self.resource.key_names(self.name, Item)})
+        with self.resource.lock:
+            self._check(self.items.get(key), ConditionExpression, ExpressionAttributeNames or {},
+                        ExpressionAttributeValues or {}, "PutItem")
+            self.items[key] = _to_dynamo(copy.deepcopy(Item))
+        return {}
+
+    def update_item(self, Key, UpdateExpression, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, **kwargs):
+        self.resource.call("UpdateItem")
+        names = ExpressionAttributeNames or {}
+        values = ExpressionAttributeValues or {}
+        with self.resource.lock:
+            current = self.items.get(self._key(Key))
+            self._check(current, ConditionExpression, names, values, "UpdateItem")
+            item = copy.deepcopy(current) if current is not None else dict(Key)
+            for action, body in re.findall(r"(SET|ADD|REMOVE)\s+(.*?)(?=\s+(?:SET|ADD|REMOVE)\s+|$)",
+                                           UpdateExpression):
+                for assignment in body.split(","):
+                    if action == "REMOVE":
+                        parts = self._path(assignment, names)
+                        target = self._get(item, parts[:-1]) if len(parts) > 1 else item
+                        if isinstance(target, dict):
+                            target.pop(parts[-1], None)
+                    elif action == "SET":
+                        path, value = assignment.split("=")
+                        parts = self._path(path, names)
+                        target = self._get(item, parts[:-1]) if len(parts) > 1 else item
+                        target[parts[-1]] = _to_dynamo(copy.deepcopy(values[value.strip()]))
+                    else:
+                        path, value = assignment.split()
+                        parts = self._path(path, names)
+                        target = self._get(item, parts[:-1]) if len(parts) > 1 else item
+                        target[parts[-1]] = target.get(parts[-1], Decimal(0)) + _to_dynamo(values[value])
+            self.items[self._key(Key)] = item
+        return {}
+
+
+class FakeDynamoDbResource(object):
+    """
+    In-memory DynamoDB resource.
+    latency_ms is added to every call, plus a random jitter up to jitter_ms. Key names of the tables are guessed
+    from the items written with put_item, the first attribute of the item being the partition key.
+    """
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.tables = {}
+        self.calls = {}
+        self.lock = threading.RLock()
+        self._key_names = {}
+
+    def call(self, operation):
+        with self.lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+        delay = self.latency_ms + (random.random() * self.jitter_ms if self.jitter_ms else 0)
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+
+    def key_names(self, table_name, item):
+        if table_name not in self._key_names:
+            self._key_names[table_name] = [next(iter(item))]
+        return self._key_names[table_name]
+
+    def Table(self, name):
+        return FakeTable(self, name)
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        self.call("BatchWriteItem")
+        for table_name, requests in RequestItems.items():
+            table = FakeTable(self, table_name)
+            for request in requests:
+                item = request["PutRequest"]["Item"]
+                key = table._key({name: item[name] for name in self.key_names(table_name, item)})
+                with self.lock:
+                    table.items[key] = _to_dynamo(copy.deepcopy(item))
+        return {"UnprocessedItems": {}}
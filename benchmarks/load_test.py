@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+Offline load test of the skill: realistic request envelopes (launch, help, stop, fallback, session ended and custom
+intents with resolved and unresolved slots, across locales) are replayed against lambda_function.lambda_handler,
+with an in-memory stand-in of DynamoDB whose latency can be injected.
+It reports requests/s, latency percentiles and allocations per intent, and can be used as a regression gate:
+the exit code is 1 when --max-p95-ms or --min-rps are not met.
+
+Usage: python benchmarks/load_test.py [--requests N] [--concurrency N] [--latency-ms MS] [--max-p95-ms MS]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+SKILL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lambda', 'py')
+sys.path.insert(0, SKILL_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Keep the benchmark output clean, the request logs and the metrics lines are still built but not printed
+os.environ.setdefault("AWS_DEFAULT_REGION", "eu-west-1")
+os.environ.setdefault("REQUEST_LOG_LEVEL", "INFO")
+os.environ.setdefault("METRICS_FILE", os.devnull)
+
+from fake_dynamodb import FakeDynamoDbResource  # noqa: E402
+from alexa import persistence  # noqa: E402
+
+LOCALES = ["en-GB", "en-US", "it-IT"]
+USERS = ["amzn1.ask.account.BENCHMARK{:04d}".format(i) for i in range(200)]
+CUSTOM_INTENT = "BenchmarkCityIntent"
+CITIES = [("London", "LON", "London"), ("the big smoke", "LON", "London"), ("Rome", "ROM", "Rome"),
+          ("Milan", "MIL", "Milan")]
+UNRESOLVED_CITIES = ["Atlantis", "Gotham"]
+
+# name: (request type, intent name, weight)
+SCENARIOS = {
+    "LaunchRequest": ("LaunchRequest", None, 20),
+    "AMAZON.HelpIntent": ("IntentRequest", "AMAZON.HelpIntent", 15),
+    "AMAZON.StopIntent": ("IntentRequest", "AMAZON.StopIntent", 15),
+    "AMAZON.FallbackIntent": ("IntentRequest", "AMAZON.FallbackIntent", 10),
+    "SessionEndedRequest": ("SessionEndedRequest", None, 10),
+    CUSTOM_INTENT + " (resolved)": ("IntentRequest", CUSTOM_INTENT, 20),
+    CUSTOM_INTENT + " (unresolved)": ("IntentRequest", CUSTOM_INTENT, 10),
+}
+
+
+def city_slot(resolved):
+    if resolved:
+        utterance, city_id, name = random.choice(CITIES)
+        status, values = "ER_SUCCESS_MATCH", [{"value": {"name": name, "id": city_id}}]
+    else:
+        utterance, status, values = random.choice(UNRESOLVED_CITIES), "ER_SUCCESS_NO_MATCH", []
+    return {"name": "city", "value": utterance, "confirmationStatus": "NONE",
+            "resolutions": {"resolutionsPerAuthority": [{
+                "authority": "amzn1.er-authority.echo-sdk.skill.CITY", "status": {"code": status},
+                "values": values}]}}
+
+
+def make_event(scenario, locale=None, user_id=None):
+    """ Builds a request envelope as sent by the Alexa service """
+    request_type, intent_name, _ = SCENARIOS[scenario]
+    locale = locale or random.choice(LOCALES)
+    user_id = user_id or random.choice(USERS)
+    request = {"type": request_type, "requestId": "amzn1.echo-api.request.{}".format(uuid.uuid4()),
+               "timestamp": "2019-04-10T21:33:00Z", "locale": locale}
+    if request_type == "IntentRequest":
+        slots = {}
+        if intent_name == CUSTOM_INTENT:
+            slots["city"] = city_slot(resolved=scenario.endswith("(resolved)"))
+        request["intent"] = {"name": intent_name, "confirmationStatus": "NONE", "slots": slots}
+    elif request_type == "SessionEndedRequest":
+        request["reason"] = "USER_INITIATED"
+    application = {"applicationId": "amzn1.ask.skill.benchmark"}
+    user = {"userId": user_id}
+    return {
+        "version": "1.0",
+        "session": {"new": request_type == "LaunchRequest", "sessionId": "amzn1.echo-api.session.benchmark",
+                    "application": application, "user": user},
+        "context": {"System": {"application": application, "user": user,
+                               "device": {"deviceId": "amzn1.ask.device.BENCHMARK", "supportedInterfaces": {}},
+                               "apiEndpoint": "https://api.eu.amazonalexa.com"}},
+        "request": request,
+    }
+
+
+def load_skill():
+    """ Imports the skill, registering a handler for the custom intent of the benchmark """
+    import lambda_function
+    from intent_handlers import BaseRequestHandler
+
+    class BenchmarkCityIntentHandler(BaseRequestHandler):
+        SLOTS = ["city"]
+        INTENT_NAMES = (CUSTOM_INTENT,)
+        USES_USER_ATTRIBUTES = True
+
+        def handle(self, handler_input):
+            super().handle(handler_input)
+            _ = handler_input.attributes_manager.request_attributes["_"]
+            self.set_attributes(handler_input, {"last_intent": CUSTOM_INTENT})
+            handler_input.response_builder.speak(_("HELP")).ask(_("HELP"))
+            return handler_input.response_builder.response
+
+    lambda_function.sb.add_request_handler(BenchmarkCityIntentHandler())
+    return lambda_function
+
+
+def percentile(ordered, value):
+    return ordered[min(len(ordered) - 1, int(round(value / 100.0 * (len(ordered) - 1))))]
+
+
+def run(skill, events, concurrency):
+    """ Replays the events, returns [(scenario, seconds)] and the wall time """
+    def invoke(scenario_event):
+        scenario, event = scenario_event
+        start = time.perf_counter()
+        response = skill.lambda_handler(event, None)
+        elapsed = time.perf_counter() - start
+        if "response" not in response:
+            raise RuntimeError("Invalid response for {}: {}".format(scenario, response))
+        return scenario, elapsed
+
+    start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            latencies = list(executor.map(invoke, events))
+    else:
+        latencies = [invoke(scenario_event) for scenario_event in events]
+    return latencies, time.perf_counter() - start
+
+
+def allocations(skill, scenarios, samples=20):
+    """ Peak traced memory and allocated blocks still alive after a request, per scenario """
+    report = {}
+    for scenario in scenarios:
+        tracemalloc.start()
+        peaks, blocks = [], []
+        for _ in range(samples):
+            event = make_event(scenario)
+            before = tracemalloc.take_snapshot()
+            tracemalloc.reset_peak()
+            skill.lambda_handler(event, None)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            after = tracemalloc.take_snapshot()
+            blocks.append(sum(stat.count_diff for stat in after.compare_to(before, 'filename')))
+        tracemalloc.stop()
+        report[scenario] = {"peak_kib": sorted(peaks)[len(peaks) // 2] / 1024.0,
+                            "retained_blocks": sorted(blocks)[len(blocks) // 2]}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000, help="requests to replay")
+    parser.add_argument("--warmup", type=int, default=100, help="requests replayed before measuring")
+    parser.add_argument("--concurrency", type=int, default=1, help="concurrent invocations")
+    parser.add_argument("--latency-ms", type=float, default=0, help="latency added to every DynamoDB call")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="random latency added on top of --latency-ms")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-allocations", action="store_true", help="skip the allocation pass")
+    parser.add_argument("--json", action="store_true", help="print the report as json")
+    parser.add_argument("--profile", metavar="FILE", help="profile the requests, writing a report per intent to FILE")
+    parser.add_argument("--max-p95-ms", type=float, help="fail if the overall p95 latency is higher")
+    parser.add_argument("--min-rps", type=float, help="fail if the throughput is lower")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    if args.profile:
+        os.environ.update(PROFILE_ENABLED="True", PROFILE_FILE=args.profile)
+    dynamodb = FakeDynamoDbResource(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms)
+    persistence.set_dynamodb_resource(dynamodb)
+    skill = load_skill()
+
+    names = list(SCENARIOS)
+    weights = [SCENARIOS[name][2] for name in names]
+    run(skill, [(name, make_event(name)) for name in random.choices(names, weights, k=args.warmup)], 1)
+    events = [(name, make_event(name)) for name in random.choices(names, weights, k=args.requests)]
+    dynamodb.calls.clear()
+    if args.profile:
+        from alexa.profiling import profiler
+        profiler.clear()  # only the measured requests
+    latencies, wall = run(skill, events, args.concurrency)
+    if args.profile:
+        profiler.write_report()
+
+    report = {"requests": len(latencies), "concurrency": args.concurrency, "dynamodb_latency_ms": args.latency_ms,
+              "requests_per_second": len(latencies) / wall, "dynamodb_calls": dict(dynamodb.calls), "intents": {}}
+    overall = sorted(seconds * 1000 for _, seconds in latencies)
+    report["overall"] = {"p50_ms": percentile(overall, 50), "p95_ms": percentile(overall, 95),
+                         "p99_ms": percentile(overall, 99)}
+    for scenario in names:
+        ordered = sorted(seconds * 1000 for name, seconds in latencies if name == scenario)
+        if ordered:
+            report["intents"][scenario] = {"count": len(ordered), "p50_ms": percentile(ordered, 50),
+                                           "p95_ms": percentile(ordered, 95), "p99_ms": percentile(ordered, 99)}
+    if not args.no_allocations:
+        for scenario, values in allocations(skill, names).items():
+            report["intents"][scenario].update(values)
+
+    failures = []
+    if args.max_p95_ms is not None and report["overall"]["p95_ms"] > args.max_p95_ms:
+        failures.append("p95 {:.2f} ms > {:.2f} ms".format(report["overall"]["p95_ms"], args.max_p95_ms))
+    if args.min_rps is not None and report["requests_per_second"] < args.min_rps:
+        failures.append("{:.0f} requests/s < {:.0f}".format(report["requests_per_second"], args.min_rps))
+    report["failures"] = failures
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print("{requests} requests, concurrency {concurrency}, DynamoDB latency {dynamodb_latency_ms} ms: "
+              "{requests_per_second:.0f} requests/s".format(**report))
+        print("DynamoDB calls: {}".format(report["dynamodb_calls"]))
+        print("{:<40} {:>6} {:>9} {:>9} {:>9} {:>10} {:>8}".format(
+            "intent", "count", "p50 ms", "p95 ms", "p99 ms", "peak KiB", "blocks"))
+        for scenario, values in list(report["intents"].items()) + [("overall", report["overall"])]:
+            print("{:<40} {:>6} {:>9.3f} {:>9.3f} {:>9.3f} {:>10} {:>8}".format(
+                scenario, values.get("count", len(latencies)), values["p50_ms"], values["p95_ms"], values["p99_ms"],
+                "{:.1f}".format(values["peak_kib"]) if "peak_kib" in values else "-",
+                values.get("retained_blocks", "-")))
+        for failure in failures:
+            print("FAILED: {}".format(failure))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
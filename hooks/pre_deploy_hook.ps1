@@ -66,6 +66,10 @@ if ($TARGET -eq "all" -Or $TARGET -eq "lambda") {
             Invoke-Expression ".venv\Scripts\pybabel compile -i $CODE_PATH\locales\$LOCALEDIR\LC_MESSAGES\data.po -l $LOCALE -o $CODE_PATH\locales\$LOCALEDIR\LC_MESSAGES\data.mo" 2>&1 | Out-Null
         }
 
+        # -------------- Step 3b: Build the offline entity resolution index from the interaction models --------------
+        Write-Output "#        Building the entity resolution index          #"
+        Invoke-Expression ".venv\Scripts\python $CODE_PATH\alexa\entity_index.py --models models --output $CODE_PATH\entity_index" 2>&1 | Out-Null
+
         # -------------- Step 4: Copy source code in sourceDir to lambda_upload ----------------------------------------
         Write-Output "# Copying files from sourceDir to lambda_upload folder #"
         $EXCLUDE_PATH = Resolve-Path -Path ((pwd).Path + "/" + $UPLOAD_DIR_PATH)
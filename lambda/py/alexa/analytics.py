@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from alexa import concurrency, persistence
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+# This file collects the analytics pipeline: payloads are buffered and written to DynamoDB in background batches,
+# so the requests don't wait for a DynamoDB round trip just to record analytics.
+# In rollup mode requests are also counted in memory, per time bucket, intent, locale and slot status, and the counters
+# are added to a rollup table every ANALYTICS_ROLLUP_FLUSH_INTERVAL seconds; raw items can then be sampled.
+
+BATCH_SIZE = 25  # BatchWriteItem limit
+FLUSH_INTERVAL = float(os.environ.get("ANALYTICS_FLUSH_INTERVAL", 1))  # seconds, used in long-lived server mode
+# On AWS lambda the flush at the end of an invocation waits up to the invocation deadline, less this margin:
+# the process is frozen once the handler returns, and the items still buffered are lost if the container is recycled
+FLUSH_DEADLINE_MARGIN = float(os.environ.get("ANALYTICS_FLUSH_DEADLINE_MARGIN", 0.5))  # seconds
+FLUSH_TIMEOUT = float(os.environ.get("ANALYTICS_FLUSH_TIMEOUT", 0.05))  # seconds, max wait without a lambda context
+# Eager mode starts writing as soon as an item is buffered, overlapping the write with the rest of the request:
+# it is the right choice on AWS lambda, where the buffer is flushed at every invocation anyway
+EAGER = os.environ.get("ANALYTICS_EAGER", 'True') == 'True'
+MAX_RETRIES = int(os.environ.get("ANALYTICS_MAX_RETRIES", 5))
+BACKOFF_BASE = 0.05  # seconds, doubled at every retry of unprocessed items
+
+ROLLUP = os.environ.get("ANALYTICS_ROLLUP", 'False') == 'True'
+ROLLUP_BUCKET = int(os.environ.get("ANALYTICS_ROLLUP_BUCKET", 3600))  # seconds of a time bucket
+ROLLUP_FLUSH_INTERVAL = float(os.environ.get("ANALYTICS_ROLLUP_FLUSH_INTERVAL", 60))  # seconds between two flushes
+RAW_SAMPLE_RATE = float(os.environ.get("ANALYTICS_RAW_SAMPLE_RATE", 1))  # fraction of requests saved as raw items
+
+
+class _Flush(object):
+    """ Marker put in the queue to ask the worker to write everything received before it """
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class AnalyticsWriter(object):
+    """
+    Buffered writer of analytics items.
+    Items are enqueued by the requests and written by a background thread with BatchWriteItem,
+    as soon as a batch is full or FLUSH_INTERVAL seconds after the first buffered item (immediately in eager mode).
+    flush() writes everything still buffered, and must be called before the lambda invocation returns.
+    """
+
+    def __init__(self, table_name, partition_key_name="request_id", attribute_name="attributes", eager=EAGER):
+        self.table_name = table_name
+        self.eager = eager
+        self.partition_key_name = partition_key_name
+        self.attribute_name = attribute_name
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def enqueue(self, partition_key, attributes):
+        """ Buffers an item, it will be written in the background """
+        self._ensure_worker()
+        self._queue.put({self.partition_key_name: partition_key, self.attribute_name: attributes})
+
+    def flush(self, timeout=FLUSH_TIMEOUT):
+        """ Writes every buffered item, returns False if they were not written within the timeout """
+        if self._thread is None:
+            return True
+        marker = _Flush()
+        self._queue.put(marker)
+        if not marker.done.wait(timeout):
+            logger.error("Analytics flush timed out after {} seconds".format(timeout))
+            return False
+        return True
+
+    def _ensure_worker(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="analytics-writer", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, _Flush):
+                self._write(batch)
+                batch, deadline = [], None
+                item.done.set()
+                continue
+
+            if item is not None:
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + (0 if self.eager else FLUSH_INTERVAL)
+            if len(batch) >= BATCH_SIZE or (deadline is not None and time.monotonic() >= deadline):
+                self._write(batch)
+                batch, deadline = [], None
+
+    def _write(self, items):
+        for start in range(0, len(items), BATCH_SIZE):
+            chunk = items[start:start + BATCH_SIZE]
+            try:
+                self._write_chunk(chunk)
+            except Exception as e:
+                logger.error("Analytics batch write failed: {}".format(e).replace("\n", "\r"))
+                self._write_one_by_one(chunk)
+
+    def _write_chunk(self, chunk):
+        dynamodb = persistence.get_dynamodb_resource()
+        request_items = {self.table_name: [{"PutRequest": {"Item": item}} for item in chunk]}
+        for attempt in range(MAX_RETRIES + 1):
+            response = dynamodb.batch_write_item(RequestItems=request_items)
+            request_items = response.get("UnprocessedItems") or {}
+            if not request_items:
+                return
+            time.sleep(BACKOFF_BASE * (2 ** attempt))
+        logger.error("Analytics items not written after {} retries: {}".format(
+            MAX_RETRIES, len(request_items.get(self.table_name, []))))
+
+    def _write_one_by_one(self, chunk):
+        """ Fallback for a failed batch, so a single malformed item doesn't drop the whole chunk """
+        table = persistence.get_dynamodb_resource().Table(self.table_name)
+        for item in chunk:
+            try:
+                table.put_item(Item=item)
+            except Exception as e:
+                logger.error("Analytics item {} not written: {}".format(
+                    item.get(self.partition_key_name), e).replace("\n", "\r"))
+
+
+def raw_sampled(sample_rate=RAW_SAMPLE_RATE):
+    """ Whether the raw analytics item of a request is saved """
+    return sample_rate >= 1 or random.random() < sample_rate
+
+
+def slot_status(slot):
+    """ Resolution status of a ResolvedSlot, as counted in the rollups """
+    if slot.synonym is None:
+        return "empty"
+    if slot.resolved_id is not None:
+        return "resolved"
+    return "validated" if slot.is_validated else "unresolved"
+
+
+class AnalyticsRollup(object):
+    """
+    In-memory counters of the requests, one item of the rollup table for each time bucket, intent and locale:
+    the item counts the requests and, for every slot, the requests with each resolution status (slot_<name>_<status>).
+    Counters are written with an atomic ADD, so every container adds its own counts to the same items.
+    """
+
+    def __init__(self, table_name, enabled=ROLLUP, bucket_seconds=ROLLUP_BUCKET, flush_interval=ROLLUP_FLUSH_INTERVAL):
+        self.table_name = table_name
+        self.enabled = enabled
+        self.bucket_seconds = bucket_seconds
+        self.flush_interval = flush_interval
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._last_flush = None  # monotonic time of the last write, short-lived containers write at their first flush
+
+    def bucket(self, timestamp=None):
+        start = int(time.time() if timestamp is None else timestamp) // self.bucket_seconds * self.bucket_seconds
+        return time.strftime("%Y-%m-%dT%H:%M", time.gmtime(start))
+
+    def add(self, intent, locale, slots, timestamp=None):
+        """ Counts a request, slots being {slot name: ResolvedSlot} """
+        key = (self.bucket(timestamp), intent, locale)
+        with self._lock:
+            counters = self._counters.setdefault(key, {})
+            counters["requests"] = counters.get("requests", 0) + 1
+            for name, slot in slots.items():
+                counter = "slot_{}_{}".format(name, slot_status(slot))
+                counters[counter] = counters.get(counter, 0) + 1
+
+    def _due(self):
+        """ Whether the counters are written now: first write of the container, interval passed or bucket complete """
+        if not self._counters:
+            return False
+        if self._last_flush is None or time.monotonic() - self._last_flush >= self.flush_interval:
+            return True
+        current = self.bucket()
+        return any(key[0] != current for key in self._counters)
+
+    def _take(self):
+        pending, self._counters = self._counters, {}
+        self._last_flush = time.monotonic()
+        return pending
+
+    def flush_if_due(self, deadline=None, background=False):
+        """
+        Writes the counters if ANALYTICS_ROLLUP_FLUSH_INTERVAL seconds passed since the last write, or a time bucket
+        is complete. The write is synchronous, until the time.monotonic() deadline, unless background is True:
+        only a long-lived process can write on the shared thread pool, AWS lambda freezes it after the invocation
+        """
+        with self._lock:
+            if not self._due():
+                return
+            pending = self._take()  # a single write per interval, even with concurrent requests
+        if background:
+            concurrency.submit(self._write_all, pending)
+        else:
+            self._write_all(pending, deadline)
+
+    def flush(self, deadline=None):
+        """ Adds the counters to the rollup table, counters not written are kept for the next flush """
+        with self._lock:
+            pending = self._take()
+        self._write_all(pending, deadline)
+
+    def _write_all(self, pending, deadline=None):
+        items = list(pending.items())
+        for index, (key, counters) in enumerate(items):
+            if deadline is not None and time.monotonic() >= deadline:
+                logger.error("Analytics rollup flush out of time, {} items left for the next one".format(
+                    len(items) - index))
+                self._restore(items[index:])
+                return
+            try:
+                self._write(key, counters)
+            except Exception as e:
+                logger.error("Analytics rollup {} not written: {}".format(key, e).replace("\n", "\r"))
+                self._restore([(key, counters)])
+
+    def _restore(self, items):
+        """ Adds back counters not written """
+        with self._lock:
+            for key, counters in items:
+                current = self._counters.setdefault(key, {})
+                for name, count in counters.items():
+                    current[name] = current.get(name, 0) + count
+
+    def _write(self, key, counters):
+        bucket, intent, locale = key
+        names = {"#b": "bucket", "#i": "intent", "#l": "locale"}
+        values = {":b": bucket, ":i": intent, ":l": locale}
+        additions = []
+        for index, (name, count) in enumerate(sorted(counters.items())):
+            names["#c{}".format(index)] = name
+            values[":c{}".format(index)] = count
+            additions.append("#c{0} :c{0}".format(index))
+        persistence.get_table(self.table_name).update_item(
+            Key={"rollup_key": "{}|{}|{}".format(bucket, intent, locale)},
+            UpdateExpression="SET #b = :b, #i = :i, #l = :l ADD " + ", ".join(additions),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values)
+
+
+analytics_writer = AnalyticsWriter(persistence.ANALYTICS_TABLE_NAME)
+analytics_rollup = AnalyticsRollup(persistence.ANALYTICS_ROLLUP_TABLE_NAME)
+
+
+def flush_timeout(context=None):
+    """ How long the end of an invocation can wait for the analytics: until the lambda deadline, less a margin """
+    if context is None or not hasattr(context, 'get_remaining_time_in_millis'):
+        return FLUSH_TIMEOUT
+    return max(context.get_remaining_time_in_millis() / 1000.0 - FLUSH_DEADLINE_MARGIN, 0)
+
+
+def flush_analytics(context=None):
+    """ Writes the rollups due and the buffered items, at the end of an invocation, within flush_timeout(context) """
+    deadline = time.monotonic() + flush_timeout(context)
+    # the background writer keeps writing the buffered items meanwhile
+    analytics_rollup.flush_if_due(deadline)
+    analytics_writer.flush(max(deadline - time.monotonic(), 0))
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+import base64
+import json
+import logging
+import math
+import os
+import zlib
+from decimal import Decimal
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+# This file collects the codecs of the user attributes, i.e. how the attributes map is stored in the DynamoDB item.
+# "plain" stores a DynamoDB map, that can be updated field by field. "binary" stores a single compressed binary
+# attribute when it is smaller than the map: large attributes take far fewer capacity units, but every write rewrites
+# the blob. Small attributes stay a plain map, a blob would be larger.
+# Items are decoded by what they contain, so items written with another codec (or before codecs) are still read,
+# and are converted to the current codec on their next write.
+
+CODEC = os.environ.get("USER_ATTRIBUTES_CODEC", "plain")
+COMPRESS_THRESHOLD = int(os.environ.get("USER_ATTRIBUTES_COMPRESS_THRESHOLD", 512))  # bytes, smaller maps stay plain
+COMPRESS_LEVEL = int(os.environ.get("USER_ATTRIBUTES_COMPRESS_LEVEL", 6))
+
+# Binary blobs start with the schema version and a flags byte, the schema version is bumped when the layout changes
+# and the decoder of every previous version is kept
+SCHEMA_VERSION = 1
+FLAG_ZLIB = 0x01
+
+# Values json has no type for are encoded as an object with a single tag key: string, number and binary sets
+# (SS, NS and BS, returned by boto3 as set) and binary values (B, returned as bytes or a Binary wrapper)
+TAG_STRING_SET = "\u0000ss"
+TAG_NUMBER_SET = "\u0000ns"
+TAG_BINARY_SET = "\u0000bs"
+TAG_BINARY = "\u0000b"
+
+
+def _encode_number(value):
+    return int(value) if value == value.to_integral_value() else float(value)
+
+
+def _encode_binary(value):
+    return base64.b64encode(bytes(getattr(value, 'value', value))).decode('ascii')
+
+
+def _encode_value(value):
+    """ json default: DynamoDB numbers are returned as Decimal and encoded as json numbers, sets and binaries tagged """
+    if isinstance(value, Decimal):
+        return _encode_number(value)
+    if isinstance(value, (bytes, bytearray)) or hasattr(value, 'value'):  # boto3 Binary wrapper
+        return {TAG_BINARY: _encode_binary(value)}
+    if isinstance(value, (set, frozenset)):
+        if all(isinstance(item, str) for item in value):
+            return {TAG_STRING_SET: sorted(value)}
+        if all(isinstance(item, (int, float, Decimal)) and not isinstance(item, bool) for item in value):
+            return {TAG_NUMBER_SET: sorted(_encode_number(Decimal(item)) for item in value)}
+        return {TAG_BINARY_SET: sorted(_encode_binary(item) for item in value)}
+    raise TypeError("{} is not serializable".format(type(value).__name__))
+
+
+def _decode_tagged(value):
+    """ json object_hook, restores the tagged values """
+    if len(value) == 1:
+        tag, item = next(iter(value.items()))
+        if tag == TAG_STRING_SET or tag == TAG_NUMBER_SET:
+            return set(item)
+        if tag == TAG_BINARY_SET:
+            return set(base64.b64decode(encoded) for encoded in item)
+        if tag == TAG_BINARY:
+            return base64.b64decode(item)
+    return value
+
+
+def item_size(value):
+    """ Approximate size of a value as DynamoDB computes it for the capacity units """
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, (int, float, Decimal)):
+        return int(math.ceil(len(str(value).lstrip('-').replace('.', '')) / 2.0)) + 1
+    if isinstance(value, dict):
+        return 3 + sum(len(key.encode('utf-8')) + item_size(item) + 1 for key, item in value.items())
+    if isinstance(value, list):
+        return 3 + sum(item_size(item) + 1 for item in value)
+    if isinstance(value, (set, frozenset)):
+        return sum(item_size(item) for item in value)
+    if hasattr(value, 'value'):  # boto3 Binary wrapper
+        return len(value.value)
+    return len(str(value))
+
+
+class PlainCodec(object):
+    """ Attributes stored as a DynamoDB map, as the ask-sdk DynamoDbAdapter does """
+    name = "plain"
+    partial_updates = True
+
+    def encode(self, attributes):
+        return attributes
+
+    def decode(self, value):
+        return value
+
+
+class BinaryCodec(object):
+    """
+    Attributes stored as zlib compressed json in a binary attribute, when they are larger than compress_threshold
+    bytes and the blob is smaller than the map: otherwise encode() returns the attributes, stored as a plain map
+    """
+    name = "binary"
+    partial_updates = False
+
+    def __init__(self, compress_threshold=COMPRESS_THRESHOLD, compress_level=COMPRESS_LEVEL):
+        self.compress_threshold = compress_threshold
+        self.compress_level = compress_level
+
+    def encode(self, attributes):
+        """ Returns the blob as bytes, or the attributes dict itself when they are stored as a plain map """
+        body = json.dumps(attributes, separators=(',', ':'), ensure_ascii=False,
+                          default=_encode_value).encode('utf-8')
+        if len(body) <= self.compress_threshold:
+            return attributes
+        blob = bytes([SCHEMA_VERSION, FLAG_ZLIB]) + zlib.compress(body, self.compress_level)
+        # The map takes at least a third of the json, so the map is only measured when the blob may not be smaller
+        if len(blob) * 3 < len(body) or len(blob) < item_size(attributes):
+            return blob
+        return attributes
+
+    def decode(self, value):
+        if isinstance(value, dict):
+            return value  # attributes small enough to be stored as a plain map
+        data = bytes(getattr(value, 'value', value))  # boto3 returns a Binary wrapper
+        if not data:
+            return {}
+        decoder = _DECODERS.get(data[0])
+        if decoder is None:
+            raise ValueError("Unknown user attributes schema version {}".format(data[0]))
+        return decoder(data)
+
+
+def _decode_v1(data):
+    flags, body = data[1], data[2:]
+    if flags & FLAG_ZLIB:
+        body = zlib.decompress(body)
+    # floats as Decimal, the same type the plain codec returns; tag keys start with an escaped NUL
+    object_hook = _decode_tagged if b'\\u0000' in body else None
+    return json.loads(body.decode('utf-8'), parse_float=Decimal, object_hook=object_hook)
+
+
+_DECODERS = {1: _decode_v1}
+
+CODECS = {PlainCodec.name: PlainCodec, BinaryCodec.name: BinaryCodec}
+
+
+def get_codec(name=CODEC):
+    """ Returns a codec instance by name, new codecs can be added to CODECS """
+    try:
+        return CODECS[name]()
+    except KeyError:
+        logger.error("Unknown user attributes codec {}, using plain".format(name))
+        return PlainCodec()
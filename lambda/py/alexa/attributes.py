@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+import copy
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import TimeoutError
+from alexa import persistence
+from alexa.attribute_codecs import get_codec
+from alexa.concurrency import submit
+from alexa.metrics import phase
+from alexa.persistence import user_id_partition_keygen
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+# This file collects the user attributes persistence: a unit of work for each request, that reads the attributes
+# at most once and writes only the changed fields in a single conditional UpdateItem at the end of the request,
+# and a cache shared by the warm invocations of the container, so repeated sessions often need no read at all.
+# How the attributes are stored in the item depends on the codec, see alexa/attribute_codecs.py.
+
+PARTITION_KEY_NAME = "user_id"
+ATTRIBUTE_NAME = "attributes"  # attributes stored as a map by the plain codec
+BINARY_ATTRIBUTE_NAME = "attributes_bin"  # attributes stored as a blob by the binary codec
+VERSION_NAME = "version"  # incremented at every write, used to detect concurrent writes from other containers
+REQUEST_ATTRIBUTE_KEY = "user_attributes"  # where the unit of work is stored in the request attributes
+
+CACHE_TTL = float(os.environ.get("USER_ATTRIBUTES_CACHE_TTL", 300))  # seconds
+CACHE_SIZE = int(os.environ.get("USER_ATTRIBUTES_CACHE_SIZE", 1024))
+PREFETCH_TIMEOUT = float(os.environ.get("USER_ATTRIBUTES_PREFETCH_TIMEOUT", 2))  # seconds, then read again inline
+
+
+class TTLCache(object):
+    """ Bounded LRU cache whose entries expire after a fixed time to live """
+
+    def __init__(self, max_size=CACHE_SIZE, ttl=CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# (attributes, version, binary) of the users seen by this container
+user_attributes_cache = TTLCache()
+user_attributes_codec = get_codec()
+
+
+class UserAttributes(object):
+    """
+    Unit of work on the attributes of a user, for a single request.
+    Attributes are read on first access, from the cache or from DynamoDB, or in background after prefetch().
+    Changes are collected with update() and written by commit() in one conditional UpdateItem,
+    that fails if someone else wrote the item meanwhile.
+    """
+
+    def __init__(self, user_id, table_name=None, cache=user_attributes_cache, codec=user_attributes_codec):
+        self.user_id = user_id
+        self.table_name = table_name if table_name is not None else persistence.USER_TABLE_NAME
+        self.cache = cache
+        self.codec = codec
+        self._attributes = None
+        self._version = 0
+        self._exists = False
+        self._binary = False  # whether the item is stored as a blob
+        self._changes = {}
+        self._prefetch = None
+        self.defaults_applied = False  # default attributes of a new user already set in this request
+
+    @property
+    def exists(self):
+        """ True if the user was already saved in DynamoDB """
+        self.load()
+        return self._exists
+
+    @property
+    def dirty(self):
+        return len(self._changes) > 0
+
+    def prefetch(self):
+        """ Starts reading the attributes in background, so the read overlaps with the rest of the request """
+        if self._attributes is not None or self._prefetch is not None:
+            return
+        cached = self.cache.get(self.user_id)
+        if cached is not None:
+            self._apply(cached[0], cached[1], True, cached[2])
+        else:
+            self._prefetch = submit(self._read)
+
+    def load(self, force=False):
+        """ Reads the attributes, from the cache if possible, at most once per request """
+        prefetch, self._prefetch = self._prefetch, None
+        if prefetch is not None and not force:
+            try:
+                self._apply(*prefetch.result(timeout=PREFETCH_TIMEOUT))
+                return
+            except TimeoutError:
+                logger.warning("User attributes prefetch timed out, reading them again")
+            except Exception as e:
+                logger.error("User attributes prefetch failed: {}".format(e).replace("\n", "\r"))
+        if self._attributes is not None and not force:
+            return
+        cached = None if force else self.cache.get(self.user_id)
+        if cached is not None:
+            self._apply(cached[0], cached[1], True, cached[2])
+        else:
+            self._apply(*self._read())
+
+    def _read(self):
+        """ Reads the user from DynamoDB, returns (attributes, version, exists, binary) """
+        with phase("dynamodb.get_user_attributes"):
+            response = persistence.get_table(self.table_name).get_item(
+                Key={PARTITION_KEY_NAME: self.user_id}, ConsistentRead=True)
+        item = response.get("Item")
+        if item is None:
+            return {}, 0, False, False
+        binary = BINARY_ATTRIBUTE_NAME in item
+        if binary:
+            attributes = get_codec("binary").decode(item[BINARY_ATTRIBUTE_NAME])
+        else:
+            attributes = item.get(ATTRIBUTE_NAME, {})  # plain map, also written by the ask-sdk DynamoDbAdapter
+        version = int(item.get(VERSION_NAME, 0))
+        self.cache.set(self.user_id, (copy.deepcopy(attributes), version, binary))
+        return attributes, version, True, binary
+
+    def _apply(self, attributes, version, exists, binary=False):
+        self._attributes = copy.deepcopy(attributes)
+        self._version = version
+        self._exists = exists
+        self._binary = binary
+
+    def get(self):
+        """ Returns the attributes, including the changes not yet committed """
+        self.load()
+        attributes = dict(self._attributes)
+        attributes.update(self._changes)
+        return attributes
+
+    def update(self, attributes):
+        """ Collects changed attributes, they are written by commit() """
+        self._changes.update(attributes)
+
+    def commit(self):
+        """ Writes the changed attributes, returns True if something was written """
+        if not self._changes:
+            return False
+        from botocore.exceptions import ClientError  # already loaded by boto3 at this point
+        self.load()
+        try:
+            binary = self._update_item()
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                raise
+            # Someone else wrote the user meanwhile, reading it again and applying our changes on top of it
+            logger.warning("Concurrent write on user attributes, retrying")
+            self.cache.invalidate(self.user_id)
+            self.load(force=True)
+            binary = self._update_item()
+
+        self._attributes.update(self._changes)
+        self._version += 1
+        self._exists = True
+        self._binary = binary
+        self._changes = {}
+        self.cache.set(self.user_id, (copy.deepcopy(self._attributes), self._version, self._binary))
+        return True
+
+    def _update_item(self):
+        """ Writes the changes, returns True if the attributes are now stored as a blob """
+        names = {"#v": VERSION_NAME}
+        values = {":new_version": self._version + 1}
+        removals = []
+        binary = False
+        if self._exists and self.codec.partial_updates and not self._binary:
+            # Only the changed fields of the map are written
+            names["#a"] = ATTRIBUTE_NAME
+            assignments = []
+            for i, (key, value) in enumerate(self._changes.items()):
+                names["#f{}".format(i)] = key
+                values[":f{}".format(i)] = value
+                assignments.append("#a.#f{0} = :f{0}".format(i))
+        else:
+            # New user, binary codec or item written with another codec: the whole attributes are written,
+            # removing the attribute of the other format so the item is migrated
+            attributes = dict(self._attributes)
+            attributes.update(self._changes)
+            names.update({"#a": ATTRIBUTE_NAME, "#b": BINARY_ATTRIBUTE_NAME})
+            values[":attributes"] = self.codec.encode(attributes)
+            binary = isinstance(values[":attributes"], bytes)  # the binary codec keeps small attributes as a map
+            if not binary:
+                assignments, removals = ["#a = :attributes"], ["#b"]
+            else:
+                assignments, removals = ["#b = :attributes"], ["#a"]
+
+        if not self._exists:
+            names["#k"] = PARTITION_KEY_NAME
+            condition = "attribute_not_exists(#k)"
+        else:
+            if self._version == 0:
+                condition = "attribute_not_exists(#v)"  # item saved before versioning was introduced
+            else:
+                condition = "#v = :old_version"
+                values[":old_version"] = self._version
+        assignments.append("#v = :new_version")
+
+        with phase("dynamodb.update_user_attributes"):
+            persistence.get_table(self.table_name).update_item(
+                Key={PARTITION_KEY_NAME: self.user_id},
+                UpdateExpression="SET " + ", ".join(assignments) + (
+                    " REMOVE " + ", ".join(removals) if removals else ""),
+                ConditionExpression=condition,
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values)
+        return binary
+
+
+def get_user_attributes(handler_input):
+    """ Returns the user attributes unit of work of the request, creating it on first use """
+    request_attributes = handler_input.attributes_manager.request_attributes
+    user_attributes = request_attributes.get(REQUEST_ATTRIBUTE_KEY)
+    if user_attributes is None:
+        user_attributes = UserAttributes(user_id_partition_keygen(handler_input.request_envelope))
+        request_attributes[REQUEST_ATTRIBUTE_KEY] = user_attributes
+    return user_attributes
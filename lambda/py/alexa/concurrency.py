@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+import contextvars
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+# This file collects the thread pool shared by the skill to run independent persistence operations of a request
+# concurrently, e.g. reading the user attributes while the analytics are being written.
+
+PERSISTENCE_WORKERS = int(os.environ.get("PERSISTENCE_WORKERS", 4))
+
+_lock = threading.Lock()
+_executor = None
+
+
+def get_executor():
+    """ Returns the thread pool shared by the whole container, creating it on first use """
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=PERSISTENCE_WORKERS, thread_name_prefix="persistence")
+    return _executor
+
+
+def submit(func, *args, **kwargs):
+    """ Runs func on the shared pool, in a copy of the current context so it is timed as part of the request """
+    context = contextvars.copy_context()
+    return get_executor().submit(context.run, func, *args, **kwargs)
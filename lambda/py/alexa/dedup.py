@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+import time
+from ask_sdk_core.dispatch_components import AbstractRequestInterceptor, AbstractResponseInterceptor, \
+    AbstractExceptionHandler
+from ask_sdk_core.serialize import DefaultSerializer
+from ask_sdk_model import Response
+from alexa import persistence
+from alexa.attributes import TTLCache
+from alexa.metrics import phase
+from alexa.responses import copy_model
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+# This file collects the deduplication of the requests redelivered by Alexa: the response of every request is kept
+# by request id, and a request seen again gets the same response back, without running the handler, writing the user
+# attributes or the analytics again. Responses are kept in memory by the container, and optionally in a DynamoDB
+# table, so a redelivery reaching another container is detected too.
+
+DEDUP_ENABLED = os.environ.get("DEDUP_ENABLED", 'True') == 'True'
+DEDUP_CACHE_SIZE = int(os.environ.get("DEDUP_CACHE_SIZE", 1024))
+DEDUP_TTL = float(os.environ.get("DEDUP_TTL", 300))  # seconds, Alexa redelivers within a few seconds
+DEDUP_DYNAMODB = os.environ.get("DEDUP_DYNAMODB", 'False') == 'True'
+
+PARTITION_KEY_NAME = "request_id"
+EXPIRES_NAME = "expires_at"  # to be set as the DynamoDB TTL attribute of the table
+RESPONSE_NAME = "response"
+SESSION_ATTRIBUTES_NAME = "session_attributes"
+
+_serializer = DefaultSerializer()
+
+
+class DuplicateRequest(Exception):
+    """ Raised by the DedupRequestInterceptor to stop the dispatch of a request already answered """
+
+    def __init__(self, request_id, response, session_attributes):
+        super().__init__("Duplicate request {}".format(request_id))
+        self.request_id = request_id
+        self.response = response
+        self.session_attributes = session_attributes
+
+
+class DedupStore(object):
+    """ Responses by request id, in a bounded in-memory LRU and optionally in DynamoDB with a conditional put """
+
+    def __init__(self, table_name=None, use_dynamodb=DEDUP_DYNAMODB, max_size=DEDUP_CACHE_SIZE, ttl=DEDUP_TTL):
+        self.table_name = table_name if table_name is not None else persistence.DEDUP_TABLE_NAME
+        self.use_dynamodb = use_dynamodb
+        self.ttl = ttl
+        self.cache = TTLCache(max_size=max_size, ttl=ttl)
+
+    def lookup(self, request_id):
+        """ Returns (response, session attributes) of a request already answered, None for a new request """
+        stored = self.cache.get(request_id)
+        if stored is not None or not self.use_dynamodb:
+            return stored
+        with phase("dynamodb.dedup"):
+            return self._claim(request_id)
+
+    def _claim(self, request_id):
+        """ Records the request id with a conditional put, that fails if another container already received it """
+        from botocore.exceptions import ClientError  # already loaded by boto3 at this point
+        table = persistence.get_table(self.table_name)
+        try:
+            table.put_item(Item={PARTITION_KEY_NAME: request_id, EXPIRES_NAME: int(time.time() + self.ttl)},
+                           ConditionExpression="attribute_not_exists(#k)",
+                           ExpressionAttributeNames={"#k": PARTITION_KEY_NAME})
+            return None
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                raise
+        item = table.get_item(Key={PARTITION_KEY_NAME: request_id}, ConsistentRead=True).get("Item", {})
+        if RESPONSE_NAME not in item:
+            # The first delivery is still in progress, or failed, on another container: this one is answered again
+            logger.warning("Request {} received again before it was answered".format(request_id))
+            return None
+        stored = (_serializer.deserialize(item[RESPONSE_NAME], Response), json.loads(item[SESSION_ATTRIBUTES_NAME]))
+        self.cache.set(request_id, stored)
+        return stored
+
+    def save(self, request_id, response, session_attributes):
+        self.cache.set(request_id, (copy_model(response), dict(session_attributes or {})))
+        if not self.use_dynamodb:
+            return
+        with phase("dynamodb.dedup"):
+            persistence.get_table(self.table_name).update_item(
+                Key={PARTITION_KEY_NAME: request_id},
+                UpdateExpression="SET #r = :r, #s = :s",
+                ExpressionAttributeNames={"#r": RESPONSE_NAME, "#s": SESSION_ATTRIBUTES_NAME},
+                ExpressionAttributeValues={":r": json.dumps(_serializer.serialize(response)),
+                                           ":s": json.dumps(session_attributes or {})})
+
+
+dedup_store = DedupStore()
+
+
+class DedupRequestInterceptor(AbstractRequestInterceptor):
+    """ Stops the dispatch of a request already answered, to be registered after the LocalizationInterceptor """
+
+    def __init__(self, store=dedup_store):
+        self.store = store
+
+    def process(self, handler_input):
+        if not DEDUP_ENABLED:
+            return
+        request_id = handler_input.request_envelope.request.request_id
+        try:
+            stored = self.store.lookup(request_id)
+        except Exception as e:
+            # A failed lookup only means a redelivery is answered again
+            logger.error("Request {} not checked for duplicates: {}".format(request_id, e).replace("\n", "\r"))
+            return
+        if stored is not None:
+            logger.warning("Duplicate request {}, replaying its response".format(request_id))
+            raise DuplicateRequest(request_id, *stored)
+
+
+class DedupResponseInterceptor(AbstractResponseInterceptor):
+    """ Keeps the response of the request, to be registered after the interceptors changing the response """
+
+    def __init__(self, store=dedup_store):
+        self.store = store
+
+    def process(self, handler_input, response):
+        if not DEDUP_ENABLED or response is None:
+            return
+        session_attributes = handler_input.attributes_manager.session_attributes \
+            if handler_input.request_envelope.session is not None else None
+        try:
+            self.store.save(handler_input.request_envelope.request.request_id, response, session_attributes)
+        except Exception as e:
+            # A response not kept only means a redelivery is answered again
+            logger.error("Response not kept for deduplication: {}".format(e).replace("\n", "\r"))
+
+
+class DuplicateRequestHandler(AbstractExceptionHandler):
+    """ Answers a duplicate request with the response of its first delivery, to be registered first """
+
+    def can_handle(self, handler_input, exception):
+        return isinstance(exception, DuplicateRequest)
+
+    def handle(self, handler_input, exception):
+        if handler_input.request_envelope.session is not None:
+            handler_input.attributes_manager.session_attributes = dict(exception.session_attributes)
+        return copy_model(exception.response)
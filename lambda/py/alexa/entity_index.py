@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+Offline entity resolution index, built from the interaction models in the models folder.
+When Alexa entity resolution returns ER_SUCCESS_NO_MATCH, the slot value is looked up in the index of the locale,
+exactly, normalized (case, accents, punctuation) and then fuzzily (trigrams and edit distance),
+to recover the canonical value and id without asking the user again.
+
+The index of a locale is a text file of sorted records, memory-mapped at runtime and searched with a binary search:
+    S <intent> <slot> <slot type>
+    K <slot type> <key> <id> <canonical name>
+with tab separated fields. It only uses the standard library, so the build step runs without the skill dependencies.
+
+Build, from the project root: python lambda/py/alexa/entity_index.py [--models models] [--output lambda/py/entity_index]
+"""
+import argparse
+import glob
+import json
+import logging
+import mmap
+import os
+import re
+import unicodedata
+from collections import namedtuple
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+SKILL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(SKILL_DIR)), 'models')
+INDEX_DIR = os.path.join(SKILL_DIR, 'entity_index')
+INDEX_EXTENSION = '.idx'
+HEADER = b"#alexa-entity-index 1\n"
+
+FUZZY_MIN_SCORE = float(os.environ.get("ENTITY_INDEX_FUZZY_MIN_SCORE", 0.8))  # 1 - edit distance / length
+FUZZY_MAX_CANDIDATES = 20  # candidates sharing the most trigrams, checked with the edit distance
+
+EntityMatch = namedtuple("EntityMatch", ["id", "name", "match_type", "score"])
+
+_NOT_WORD = re.compile(r'[\W_]+', re.UNICODE)
+
+
+def normalize(value):
+    """ Lower case, without accents and punctuation, single spaces """
+    value = unicodedata.normalize('NFKD', value.lower())
+    value = ''.join(char for char in value if not unicodedata.combining(char))
+    return _NOT_WORD.sub(' ', value).strip()
+
+
+def exact_key(value):
+    return ' '.join(value.lower().split())
+
+
+def trigrams(value):
+    padded = "  {} ".format(value)
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, max_distance):
+    """ Levenshtein distance, stops early returning max_distance + 1 once it can't be within max_distance """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+# --------- Build
+
+def _clean(value):
+    return value.replace('\t', ' ').replace('\n', ' ').strip()
+
+
+def model_records(model):
+    """ Returns the index records of an interaction model """
+    language_model = model.get("interactionModel", {}).get("languageModel", {})
+    records = set()
+    for intent in language_model.get("intents", []):
+        for slot in intent.get("slots", []):
+            records.add("S\t{}\t{}\t{}".format(_clean(intent["name"]), _clean(slot["name"]), _clean(slot["type"])))
+    for slot_type in language_model.get("types", []):
+        type_name = _clean(slot_type["name"])
+        for value in slot_type.get("values", []):
+            name = _clean(value["name"]["value"])
+            value_id = _clean(value.get("id") or name)
+            for synonym in [name] + value["name"].get("synonyms", []):
+                for key in {exact_key(_clean(synonym)), normalize(synonym)}:
+                    if key:
+                        records.add("K\t{}\t{}\t{}\t{}".format(type_name, key, value_id, name))
+    return records
+
+
+def build(models_dir=MODELS_DIR, output_dir=INDEX_DIR):
+    """ Builds the index of every model in models_dir, returns {locale: records} """
+    built = {}
+    for model_path in sorted(glob.glob(os.path.join(models_dir, '*.json'))):
+        locale = os.path.splitext(os.path.basename(model_path))[0]
+        with open(model_path, encoding='utf-8') as fp:
+            records = model_records(json.load(fp))
+        lines = sorted(record.encode('utf-8') for record in records)
+        if not os.path.isdir(output_dir):
+            os.makedirs(output_dir)
+        with open(os.path.join(output_dir, locale + INDEX_EXTENSION), 'wb') as fp:
+            fp.write(HEADER)
+            for line in lines:
+                fp.write(line + b"\n")
+        built[locale] = len(lines)
+    return built
+
+
+# --------- Runtime
+
+class EntityIndex(object):
+    """ Memory-mapped index of a locale """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as fp:
+            self._mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(HEADER)] != HEADER:
+            raise ValueError("{} is not an entity index".format(path))
+        self.slot_types = {}
+        self._offsets = []  # start of every K record, in sorted order
+        offset = len(HEADER)
+        while offset < len(self._mm):
+            end = self._mm.find(b"\n", offset)
+            if self._mm[offset:offset + 2] == b"S\t":
+                _, intent, slot, slot_type = self._mm[offset:end].decode('utf-8').split('\t')
+                self.slot_types[(intent, slot)] = slot_type
+            else:
+                self._offsets.append(offset)
+            offset = end + 1
+        self._fuzzy = {}
+
+    def _line(self, position):
+        offset = self._offsets[position]
+        return self._mm[offset:self._mm.find(b"\n", offset)]
+
+    def _lower_bound(self, prefix):
+        low, high = 0, len(self._offsets)
+        while low < high:
+            middle = (low + high) // 2
+            if self._line(middle) < prefix:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _lookup(self, slot_type, key):
+        prefix = "K\t{}\t{}\t".format(slot_type, key).encode('utf-8')
+        position = self._lower_bound(prefix)
+        if position < len(self._offsets):
+            line = self._line(position)
+            if line.startswith(prefix):
+                return line.decode('utf-8').split('\t')[3:5]
+        return None
+
+    def _fuzzy_index(self, slot_type):
+        """ Trigram index of the normalized keys of a slot type, built on first fuzzy lookup """
+        if slot_type not in self._fuzzy:
+            prefix = "K\t{}\t".format(slot_type).encode('utf-8')
+            keys, grams = [], {}
+            position = self._lower_bound(prefix)
+            while position < len(self._offsets):
+                line = self._line(position)
+                if not line.startswith(prefix):
+                    break
+                _, _, key, value_id, name = line.decode('utf-8').split('\t')
+                position += 1
+                if normalize(key) != key:
+                    continue  # exact key, its normalized form is indexed too
+                for gram in trigrams(key):
+                    grams.setdefault(gram, []).append(len(keys))
+                keys.append((key, value_id, name))
+            self._fuzzy[slot_type] = (keys, grams)
+        return self._fuzzy[slot_type]
+
+    def resolve(self, slot_type, value):
+        """ Returns the EntityMatch of a value for a slot type, None if nothing is close enough """
+        if not value:
+            return None
+        found = self._lookup(slot_type, exact_key(value))
+        if found is not None:
+            return EntityMatch(found[0], found[1], "exact", 1.0)
+        normalized = normalize(value)
+        found = self._lookup(slot_type, normalized)
+        if found is not None:
+            return EntityMatch(found[0], found[1], "normalized", 1.0)
+
+        keys, grams = self._fuzzy_index(slot_type)
+        shared = {}
+        for gram in trigrams(normalized):
+            for position in grams.get(gram, ()):
+                shared[position] = shared.get(position, 0) + 1
+        best = None
+        for position in sorted(shared, key=shared.get, reverse=True)[:FUZZY_MAX_CANDIDATES]:
+            key, value_id, name = keys[position]
+            length = max(len(key), len(normalized))
+            # epsilon: 1 - 0.8 is 0.19999999999999996, the bound must not be truncated one too low
+            max_distance = int(length * (1 - FUZZY_MIN_SCORE) + 1e-9)
+            distance = edit_distance(normalized, key, max_distance)
+            if distance > max_distance:
+                continue  # capped distance, the key is not close enough
+            score = 1 - distance / float(length)
+            if best is None or score > best.score:
+                best = EntityMatch(value_id, name, "fuzzy", score)
+        return best
+
+    def resolve_slot(self, intent_name, slot_name, value):
+        """ Resolves a value of a slot of an intent, None if the slot type is not a custom type of the model """
+        slot_type = self.slot_types.get((intent_name, slot_name))
+        if slot_type is None:
+            return None
+        return self.resolve(slot_type, value)
+
+
+@lru_cache(maxsize=None)
+def get_index(locale):
+    """ Returns the index of a locale, or of its language, None if there is none """
+    candidates = [locale, locale.replace('_', '-'), locale.replace('_', '-').split('-')[0]] if locale else []
+    for candidate in candidates:
+        path = os.path.join(INDEX_DIR, candidate + INDEX_EXTENSION)
+        if os.path.isfile(path):
+            return EntityIndex(path)
+    return None
+
+
+def resolve_slot(locale, intent_name, slot_name, value):
+    """ Resolves a slot value with the index of the locale, returns an EntityMatch or None """
+    index = get_index(locale)
+    if index is None:
+        return None
+    return index.resolve_slot(intent_name, slot_name, value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", default=MODELS_DIR, help="folder of the interaction models")
+    parser.add_argument("--output", default=INDEX_DIR, help="folder of the indexes")
+    args = parser.parse_args()
+    for locale, records in build(args.models, args.output).items():
+        print("{}: {} records".format(locale, records))
+
+
+if __name__ == '__main__':
+    main()
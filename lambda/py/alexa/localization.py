@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+import gettext
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+# This file collects the gettext catalogs of the skill, loaded once per container and shared by every request.
+
+DOMAIN = 'data'
+LOCALE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'locales')
+LOCALE_CACHE_SIZE = int(os.environ.get("LOCALE_CACHE_SIZE", 32))
+
+_cache_listeners = []
+
+
+def available_locales():
+    """ Returns the locales that have a compiled catalog under the locales folder """
+    try:
+        folders = sorted(os.listdir(LOCALE_DIR))
+    except OSError:
+        return []
+    return [folder for folder in folders
+            if os.path.isfile(os.path.join(LOCALE_DIR, folder, 'LC_MESSAGES', DOMAIN + '.mo'))]
+
+
+def locale_candidates(locale):
+    """ Returns the catalog names to look for, from the most to the least specific (e.g. it-IT, it_IT, it) """
+    if not locale:
+        return []
+    candidates = []
+    for candidate in (locale, locale.replace('_', '-'), locale.replace('-', '_'), locale.replace('_', '-').split('-')[0]):
+        if candidate not in candidates:
+            candidates.append(candidate)
+    return candidates
+
+
+@lru_cache(maxsize=LOCALE_CACHE_SIZE)
+def get_translation(locale):
+    """ Returns the gettext translation for a locale, resolving fallbacks only the first time the locale is seen """
+    for candidate in locale_candidates(locale):
+        mo_file = gettext.find(DOMAIN, localedir=LOCALE_DIR, languages=[candidate])
+        if mo_file is not None:
+            with open(mo_file, 'rb') as fp:
+                return gettext.GNUTranslations(fp)
+    logger.warning("No catalog found for locale {}, messages will not be translated".format(locale))
+    return gettext.NullTranslations()
+
+
+def get_translator(locale):
+    """ Returns the shared gettext callable for a locale """
+    return get_translation(locale).gettext
+
+
+def preload_catalogs():
+    """ Loads every catalog present under the locales folder, meant to be called at cold start """
+    locales = available_locales()
+    for locale in locales:
+        get_translation(locale)
+    return locales
+
+
+def add_cache_listener(listener):
+    """ Registers a function called without arguments when the catalogs are dropped, e.g. to drop translated data """
+    _cache_listeners.append(listener)
+
+
+def clear_cache():
+    """ Drops every loaded catalog, so they are read again from disk on next use """
+    get_translation.cache_clear()
+    for listener in _cache_listeners:
+        listener()
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+import random
+from ask_sdk_core.serialize import DefaultSerializer
+
+# This file collects the logging of alexa requests and responses: a compact single-line json,
+# built only when the log is enabled and the request is sampled, with the user identifiers redacted.
+
+logger = logging.getLogger(__name__)
+logger.setLevel(os.environ.get("REQUEST_LOG_LEVEL", "INFO"))  # set it to WARNING to disable the requests log
+
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", 1))  # fraction of the requests that are logged
+LOG_MAX_PAYLOAD = int(os.environ.get("LOG_MAX_PAYLOAD", 8192))  # characters, longer payloads are truncated
+LOG_REDACTED_FIELDS = frozenset(
+    field.strip() for field in os.environ.get(
+        "LOG_REDACTED_FIELDS", "userId,deviceId,personId,accessToken,apiAccessToken,consentToken").split(",")
+    if field.strip())
+
+SAMPLED_KEY = "log_sampled"  # where the sampling decision is stored in the request attributes
+REDACTED = "***"
+
+_serializer = DefaultSerializer()
+
+
+def redact(data):
+    """ Returns a copy of serialized data, replacing the values of the redacted fields """
+    if isinstance(data, dict):
+        return {key: REDACTED if key in LOG_REDACTED_FIELDS and value is not None else redact(value)
+                for key, value in data.items()}
+    if isinstance(data, list):
+        return [redact(value) for value in data]
+    return data
+
+
+def format_payload(obj):
+    """
+    Serializes an ask-sdk model object as compact json, redacted and truncated.
+    A truncated payload is returned as a json string, so the log line is still valid json
+    """
+    payload = json.dumps(redact(_serializer.serialize(obj)), separators=(',', ':'), default=str)
+    if len(payload) > LOG_MAX_PAYLOAD:
+        payload = json.dumps("{}...(truncated, {} characters)".format(payload[:LOG_MAX_PAYLOAD], len(payload)))
+    return payload
+
+
+def is_sampled(handler_input):
+    """ Decides once per request if it is logged, so the response is logged together with its request """
+    request_attributes = handler_input.attributes_manager.request_attributes
+    sampled = request_attributes.get(SAMPLED_KEY)
+    if sampled is None:
+        sampled = LOG_SAMPLE_RATE >= 1 or random.random() < LOG_SAMPLE_RATE
+        request_attributes[SAMPLED_KEY] = sampled
+    return sampled
+
+
+def log_model(handler_input, kind, obj):
+    """ Logs a request envelope or a response, serializing it only if it is going to be written """
+    if not logger.isEnabledFor(logging.INFO) or not is_sampled(handler_input):
+        return
+    logger.info('{{"type":"{}","request_id":{},"payload":{}}}'.format(
+        kind, json.dumps(handler_input.request_envelope.request.request_id), format_payload(obj)))
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from ask_sdk_core.dispatch_components import AbstractRequestInterceptor, AbstractResponseInterceptor
+from ask_sdk_runtime.dispatch_components import GenericHandlerAdapter
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+# This file collects the latency instrumentation of the skill: every request gets a timer recording the duration of
+# its phases (interceptors, handler, DynamoDB calls, analytics), emitted as CloudWatch Embedded Metric Format lines.
+# Phases can be nested, e.g. the DynamoDB calls of a handler are also part of the "handler" phase.
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", 'True') == 'True'
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "AlexaSkill")
+METRICS_FILE = os.environ.get("METRICS_FILE")  # if set, metrics are appended to this file instead of stdout
+# In long-lived mode, per-request lines are replaced by p50/p95/p99 aggregates emitted every interval
+METRICS_AGGREGATE = os.environ.get("METRICS_AGGREGATE", 'False') == 'True'
+METRICS_AGGREGATE_INTERVAL = float(os.environ.get("METRICS_AGGREGATE_INTERVAL", 60))  # seconds
+METRICS_AGGREGATE_SAMPLES = int(os.environ.get("METRICS_AGGREGATE_SAMPLES", 2048))  # kept per intent and phase
+
+DIMENSIONS = ("intent", "locale")
+PERCENTILES = (50, 95, 99)
+
+_current_timer = contextvars.ContextVar("request_timer", default=None)
+_sink_lock = threading.Lock()
+
+
+class RequestTimer(object):
+    """ Durations of the phases of a request, in seconds """
+
+    def __init__(self, intent=None, locale=None):
+        self.start = time.perf_counter()
+        self.intent = intent
+        self.locale = locale
+        self.phases = {}
+
+    def record(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0) + seconds
+
+
+def start_request(intent=None, locale=None):
+    """ Starts timing the request running in the current context """
+    if not METRICS_ENABLED:
+        return None
+    timer = RequestTimer(intent, locale)
+    _current_timer.set(timer)
+    return timer
+
+
+def current_timer():
+    return _current_timer.get()
+
+
+@contextmanager
+def phase(name):
+    """ Records the duration of the block as a phase of the current request, if it is being timed """
+    timer = _current_timer.get()
+    if timer is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.record(name, time.perf_counter() - start)
+
+
+def finish_request():
+    """ Stops timing the current request and emits its metrics """
+    timer = _current_timer.get()
+    if timer is None:
+        return None
+    _current_timer.set(None)
+    timer.record("total", time.perf_counter() - timer.start)
+    if METRICS_AGGREGATE:
+        aggregator.add(timer)
+        aggregator.emit_if_due()
+    else:
+        write(emf_line(timer.intent, timer.locale, {name: seconds * 1000 for name, seconds in timer.phases.items()}))
+    return timer
+
+
+def emf_line(intent, locale, values, unit="Milliseconds"):
+    """ Builds a CloudWatch Embedded Metric Format line """
+    document = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": METRICS_NAMESPACE,
+                "Dimensions": [list(DIMENSIONS)],
+                "Metrics": [{"Name": name, "Unit": "Count" if name == "requests" else unit} for name in values],
+            }],
+        },
+        "intent": intent or "unknown",
+        "locale": locale or "unknown",
+    }
+    document.update({name: round(value, 3) for name, value in values.items()})
+    return json.dumps(document, separators=(',', ':'))
+
+
+def write(line):
+    """ Writes a metrics line to the sink, stdout is collected by CloudWatch on AWS lambda """
+    with _sink_lock:
+        if METRICS_FILE:
+            with open(METRICS_FILE, 'a') as fp:
+                fp.write(line + "\n")
+        else:
+            sys.stdout.write(line + "\n")
+            sys.stdout.flush()
+
+
+class LatencyAggregator(object):
+    """ Keeps the latest samples of every phase, per intent and locale, and emits their percentiles """
+
+    def __init__(self, max_samples=METRICS_AGGREGATE_SAMPLES, interval=METRICS_AGGREGATE_INTERVAL):
+        self.max_samples = max_samples
+        self.interval = interval
+        self._samples = {}
+        self._requests = {}
+        self._last_emit = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add(self, timer):
+        key = (timer.intent, timer.locale)
+        with self._lock:
+            self._requests[key] = self._requests.get(key, 0) + 1
+            phases = self._samples.setdefault(key, {})
+            for name, seconds in timer.phases.items():
+                samples = phases.setdefault(name, [])
+                samples.append(seconds * 1000)
+                if len(samples) > self.max_samples:
+                    del samples[:len(samples) - self.max_samples]
+
+    def snapshot(self, reset=False):
+        """ Returns {(intent, locale): {"requests": n, "<phase>.p50": ms, ...}} """
+        with self._lock:
+            samples, requests = self._samples, self._requests
+            if reset:
+                self._samples, self._requests = {}, {}
+        report = {}
+        for key, phases in samples.items():
+            values = {"requests": requests.get(key, 0)}
+            for name, phase_samples in phases.items():
+                ordered = sorted(phase_samples)
+                for percentile in PERCENTILES:
+                    index = min(len(ordered) - 1, int(round(percentile / 100.0 * (len(ordered) - 1))))
+                    values["{}.p{}".format(name, percentile)] = ordered[index]
+            report[key] = values
+        return report
+
+    def emit(self):
+        self._last_emit = time.monotonic()
+        for (intent, locale), values in self.snapshot(reset=True).items():
+            write(emf_line(intent, locale, values))
+
+    def emit_if_due(self):
+        if time.monotonic() - self._last_emit >= self.interval:
+            self.emit()
+
+
+aggregator = LatencyAggregator()
+
+
+class TimingRequestInterceptor(AbstractRequestInterceptor):
+    """ Starts timing the request, must be the first global request interceptor """
+    def process(self, handler_input):
+        request = handler_input.request_envelope.request
+        intent = getattr(request, 'intent', None)
+        start_request(intent=intent.name if intent is not None else request.object_type, locale=request.locale)
+
+
+class TimingResponseInterceptor(AbstractResponseInterceptor):
+    """ Records the time spent dispatching the request, must be the last global response interceptor """
+    def process(self, handler_input, response):
+        timer = _current_timer.get()
+        if timer is not None:
+            timer.record("dispatch", time.perf_counter() - timer.start)
+
+
+class TimedRequestInterceptor(AbstractRequestInterceptor):
+    """ Records the duration of a request interceptor as a phase named after its class """
+    def __init__(self, interceptor):
+        self.interceptor = interceptor
+        self.name = "interceptor.{}".format(type(interceptor).__name__)
+
+    def process(self, handler_input):
+        with phase(self.name):
+            self.interceptor.process(handler_input=handler_input)
+
+
+class TimedResponseInterceptor(AbstractResponseInterceptor):
+    """ Records the duration of a response interceptor as a phase named after its class """
+    def __init__(self, interceptor):
+        self.interceptor = interceptor
+        self.name = "interceptor.{}".format(type(interceptor).__name__)
+
+    def process(self, handler_input, response):
+        with phase(self.name):
+            self.interceptor.process(handler_input=handler_input, response=response)
+
+
+def timed(interceptor):
+    """ Wraps an interceptor so its duration is recorded """
+    if isinstance(interceptor, AbstractResponseInterceptor):
+        return TimedResponseInterceptor(interceptor)
+    return TimedRequestInterceptor(interceptor)
+
+
+class TimedHandlerAdapter(GenericHandlerAdapter):
+    """ Handler adapter recording the duration of the request handler """
+    def execute(self, handler_input, handler):
+        with phase("handler"):
+            return super().execute(handler_input, handler)
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+import threading
+from ask_sdk_core.exceptions import PersistenceException
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+# This file collects the DynamoDB connection shared by every handler and interceptor of the skill.
+# The session, the resource and the adapters are created once per container and reused by every warm invocation.
+# boto3 and the ask-sdk DynamoDB adapter are imported on first use only, as they are the slowest imports of the skill.
+
+AWS_REGION = "eu-west-1"
+AWS_ACCESS_KEY_ID = ""  # TODO add here AWS keys
+AWS_SECRET_ACCESS_KEY = ""  # TODO add here AWS keys
+
+USER_TABLE_NAME = None  # TODO user attributes table name
+ANALYTICS_TABLE_NAME = ""  # TODO add request analysis dynamodb table name
+DEDUP_TABLE_NAME = ""  # TODO add request deduplication dynamodb table name, partition key "request_id"
+ANALYTICS_ROLLUP_TABLE_NAME = ""  # TODO add analytics rollup dynamodb table name, partition key "rollup_key"
+
+# Connection pool settings, they can be tuned through environment variables
+MAX_POOL_CONNECTIONS = int(os.environ.get("DYNAMODB_MAX_POOL_CONNECTIONS", 10))
+CONNECT_TIMEOUT = float(os.environ.get("DYNAMODB_CONNECT_TIMEOUT", 1))
+READ_TIMEOUT = float(os.environ.get("DYNAMODB_READ_TIMEOUT", 2))
+MAX_ATTEMPTS = int(os.environ.get("DYNAMODB_MAX_ATTEMPTS", 3))
+TCP_KEEPALIVE = os.environ.get("DYNAMODB_TCP_KEEPALIVE", 'True') == 'True'
+
+_lock = threading.Lock()
+_session = None
+_dynamodb = None
+_adapters = {}
+_tables = {}
+
+
+def get_session():
+    """ Returns the boto3 session shared by the whole container, creating it on first use """
+    global _session
+    if _session is None:
+        import boto3
+        with _lock:
+            if _session is None:
+                _session = boto3.session.Session(region_name=AWS_REGION,
+                                                 aws_access_key_id=AWS_ACCESS_KEY_ID or None,
+                                                 aws_secret_access_key=AWS_SECRET_ACCESS_KEY or None)
+    return _session
+
+
+def get_dynamodb_resource():
+    """ Returns the DynamoDB resource shared by the whole container, creating it on first use """
+    global _dynamodb
+    if _dynamodb is None:
+        session = get_session()
+        with _lock:
+            if _dynamodb is None:
+                from botocore.config import Config
+                config = Config(max_pool_connections=MAX_POOL_CONNECTIONS,
+                                connect_timeout=CONNECT_TIMEOUT,
+                                read_timeout=READ_TIMEOUT,
+                                retries={"max_attempts": MAX_ATTEMPTS, "mode": "standard"},
+                                tcp_keepalive=TCP_KEEPALIVE)
+                _dynamodb = session.resource('dynamodb', config=config)
+    return _dynamodb
+
+
+def set_dynamodb_resource(dynamodb_resource):
+    """ Replaces the shared DynamoDB resource (e.g. with a local stand-in), dropping the adapters built on the old one """
+    global _dynamodb
+    with _lock:
+        _dynamodb = dynamodb_resource
+        _adapters.clear()
+        _tables.clear()
+
+
+def user_id_partition_keygen(request_envelope):
+    """
+    Retrieve user id from request envelope, to use as partition key.
+    Same as the ask-sdk default keygen, without importing the DynamoDB adapter
+    """
+    try:
+        return request_envelope.context.system.user.user_id
+    except AttributeError:
+        raise PersistenceException("Couldn't retrieve user id from "
+                                   "request envelope, for partition key use")
+
+
+def get_adapter(table_name, partition_key_name, partition_keygen, attribute_name="attributes"):
+    """ Returns the DynamoDbAdapter registered for a table, creating it on first use """
+    key = (table_name, partition_key_name, attribute_name)
+    adapter = _adapters.get(key)
+    if adapter is None:
+        dynamodb = get_dynamodb_resource()
+        with _lock:
+            adapter = _adapters.get(key)
+            if adapter is None:
+                from ask_sdk_dynamodb.adapter import DynamoDbAdapter
+                adapter = DynamoDbAdapter(table_name=table_name,
+                                          partition_key_name=partition_key_name,
+                                          attribute_name=attribute_name,
+                                          partition_keygen=partition_keygen,
+                                          create_table=False,
+                                          dynamodb_resource=dynamodb)
+                _adapters[key] = adapter
+    return adapter
+
+
+def get_table(table_name):
+    """ Returns the shared Table resource of a table, for the operations the adapters don't expose """
+    table = _tables.get(table_name)
+    if table is None:
+        table = get_dynamodb_resource().Table(table_name)
+        _tables[table_name] = table
+    return table
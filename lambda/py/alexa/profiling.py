@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+from functools import wraps
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+# This file collects the opt-in profiler of the skill: sampled invocations are run under cProfile, their statistics
+# are aggregated per intent and the hottest functions are written to a local report file.
+# When profiling is disabled the skill handler is not even wrapped, so it costs nothing.
+
+PROFILE_ENABLED = os.environ.get("PROFILE_ENABLED", 'False') == 'True'  # profiles every invocation
+PROFILE_SAMPLE_RATE = 1.0 if PROFILE_ENABLED else float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+PROFILE_FILE = os.environ.get("PROFILE_FILE", "/tmp/profile_report.txt")  # /tmp is writable on AWS lambda
+PROFILE_REPORT_INTERVAL = float(os.environ.get("PROFILE_REPORT_INTERVAL", 60))  # seconds between two reports
+PROFILE_TOP = int(os.environ.get("PROFILE_TOP", 25))  # functions listed per intent
+PROFILE_SORT = os.environ.get("PROFILE_SORT", "cumulative")  # any pstats sort key, e.g. tottime
+
+
+def event_intent(event):
+    """ Intent name, or request type, of a serialized request envelope """
+    request = event.get("request", {}) if isinstance(event, dict) else {}
+    return request.get("intent", {}).get("name") or request.get("type") or "unknown"
+
+
+class Profiler(object):
+    """
+    Profiles a sample of the invocations and keeps their statistics per intent.
+    Only one invocation at a time is profiled, concurrent ones run normally.
+    """
+
+    def __init__(self, sample_rate=PROFILE_SAMPLE_RATE, report_file=PROFILE_FILE, interval=PROFILE_REPORT_INTERVAL):
+        self.sample_rate = sample_rate
+        self.report_file = report_file
+        self.interval = interval
+        self._stats = {}
+        self._requests = {}
+        self._busy = threading.Lock()
+        self._lock = threading.Lock()
+        self._last_report = time.monotonic()
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0
+
+    def wrap(self, handler):
+        """ Returns handler(event, context) profiled on a sample of the invocations, handler itself if disabled """
+        if not self.enabled:
+            return handler
+
+        @wraps(handler)
+        def profiled_handler(event, context):
+            if random.random() >= self.sample_rate or not self._busy.acquire(blocking=False):
+                return handler(event, context)
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+                try:
+                    return handler(event, context)
+                finally:
+                    profile.disable()
+            finally:
+                self._busy.release()
+                self.add(event_intent(event), profile)
+                self.report_if_due()
+        return profiled_handler
+
+    def add(self, intent, profile):
+        with self._lock:
+            if intent in self._stats:
+                self._stats[intent].add(profile)
+            else:
+                self._stats[intent] = pstats.Stats(profile)
+            self._requests[intent] = self._requests.get(intent, 0) + 1
+
+    def report(self, top=PROFILE_TOP, sort=PROFILE_SORT):
+        """ Returns the text report: the hottest functions of every intent, over the invocations profiled so far """
+        stream = io.StringIO()
+        with self._lock:
+            for intent in sorted(self._stats):
+                stream.write("=== {} ({} invocations profiled)\n".format(intent, self._requests[intent]))
+                stats = self._stats[intent]
+                stats.stream = stream
+                stats.sort_stats(sort).print_stats(top)
+        return stream.getvalue()
+
+    def write_report(self):
+        """ Writes the report to the report file, replacing the previous one """
+        self._last_report = time.monotonic()
+        if not self._stats:
+            return
+        try:
+            with open(self.report_file, 'w') as fp:
+                fp.write(self.report())
+        except OSError as e:
+            logger.error("Profile report not written: {}".format(e))
+
+    def report_if_due(self):
+        if time.monotonic() - self._last_report >= self.interval:
+            self.write_report()
+
+    def clear(self):
+        with self._lock:
+            self._stats, self._requests = {}, {}
+
+
+profiler = Profiler()
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+import copy
+import logging
+import threading
+from ask_sdk_core.response_helper import ResponseFactory
+from ask_sdk_model.ui import SimpleCard
+from alexa import localization
+from alexa.utils import convert_speech_to_text
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+# This file collects the static responses of the skill: responses that depend only on the locale (help, exit, fallback)
+# are built once per locale, card included, and every request gets a copy of the template.
+# Templates are dropped when the gettext catalogs are reloaded, see localization.clear_cache.
+
+# Request attribute set when the response was served from a template, the AddCardInterceptor skips these responses
+STATIC_RESPONSE_KEY = "static_response"
+
+
+def copy_model(obj):
+    """ Copy of an ask_sdk_model object, faster than copy.deepcopy since strings and numbers are shared """
+    if hasattr(obj, 'deserialized_types'):
+        obj = copy.copy(obj)
+        for name in obj.deserialized_types:
+            value = getattr(obj, name, None)
+            if value is not None and not isinstance(value, (str, bool, int, float)):
+                setattr(obj, name, copy_model(value))
+        return obj
+    if isinstance(obj, list):
+        return [copy_model(item) for item in obj]
+    return obj
+
+
+class ResponseTemplates(object):
+    """
+    Registry of the static responses.
+    A template is a function (translator, response_builder) -> Response, registered with the template decorator
+    and built the first time a locale needs it, or at cold start with preload.
+    """
+
+    def __init__(self):
+        self._builders = {}
+        self._responses = {}
+        self._lock = threading.Lock()
+        localization.add_cache_listener(self.clear)
+
+    def template(self, name):
+        """ Decorator registering a template builder """
+        def register(build):
+            self._builders[name] = build
+            self.clear()
+            return build
+        return register
+
+    def build(self, name, locale):
+        """ Builds the template of a locale, with the same card the AddCardInterceptor would add """
+        _ = localization.get_translator(locale)
+        response = self._builders[name](_, ResponseFactory())
+        if response.card is None and response.output_speech is not None:
+            response.card = SimpleCard(title=convert_speech_to_text(_("SKILL_NAME")),
+                                       content=convert_speech_to_text(getattr(response.output_speech, 'ssml', None)))
+        return response
+
+    def get(self, name, locale):
+        """ Returns a copy of the template of a locale """
+        key = (name, locale)
+        response = self._responses.get(key)
+        if response is None:
+            with self._lock:
+                response = self._responses.get(key)
+                if response is None:
+                    response = self._responses[key] = self.build(name, locale)
+        return copy_model(response)
+
+    def serve(self, handler_input, name):
+        """ Returns the response of the template for the locale of the request """
+        handler_input.attributes_manager.request_attributes[STATIC_RESPONSE_KEY] = True
+        return self.get(name, handler_input.request_envelope.request.locale)
+
+    def preload(self, locales=None):
+        """ Builds every template for the locales, by default the ones with a catalog, meant for cold start """
+        locales = localization.available_locales() if locales is None else locales
+        for locale in locales:
+            for name in self._builders:
+                self.get(name, locale)
+        return locales
+
+    def clear(self):
+        """ Drops every built template, they are built again on next use """
+        with self._lock:
+            self._responses = {}
+
+
+response_templates = ResponseTemplates()
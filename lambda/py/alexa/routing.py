@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+from ask_sdk_model import RequestEnvelope
+from ask_sdk_core.skill import CustomSkill
+from ask_sdk_core.skill_builder import SkillBuilder
+from ask_sdk_runtime.dispatch_components import GenericRequestMapper
+from alexa.metrics import TimedHandlerAdapter
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+# This file collects the request routing of the skill: handlers declaring the request types and intent names they
+# handle are found with a dict lookup, instead of calling the can_handle of every registered handler.
+
+
+class RoutingRequestMapper(GenericRequestMapper):
+    """
+    Request mapper indexing the handlers by (request type, intent name).
+    Handlers expose their keys with a routes() method, the ones without it (or returning no keys) are dynamic
+    and their can_handle is still called, in registration order, so the first registered handler always wins.
+    """
+    _routing_table = None
+
+    def add_request_handler_chain(self, request_handler_chain):
+        super().add_request_handler_chain(request_handler_chain)
+        self._routing_table = None
+
+    @property
+    def routing_table(self):
+        """ Returns (index, dynamic chains), built on first use """
+        if self._routing_table is None:
+            self.build_routing_table()
+        return self._routing_table
+
+    def build_routing_table(self):
+        """ Indexes the registered handlers by their routes """
+        index = {}
+        dynamic = []
+        for position, chain in enumerate(self.request_handler_chains):
+            routes = getattr(chain.request_handler, 'routes', None)
+            keys = routes() if routes is not None else ()
+            if not keys:
+                dynamic.append((position, chain))
+            for key in keys:
+                index.setdefault(key, (position, chain))
+        self._routing_table = (index, dynamic)
+
+    def get_request_handler_chain(self, handler_input):
+        index, dynamic = self.routing_table
+        request = handler_input.request_envelope.request
+        request_type = request.object_type
+        found = index.get((request_type, None))
+        intent = getattr(request, 'intent', None)
+        if intent is not None:
+            by_intent = index.get((request_type, intent.name))
+            if by_intent is not None and (found is None or by_intent[0] < found[0]):
+                found = by_intent
+
+        # Dynamic handlers registered before the indexed one keep their precedence
+        last_position = found[0] if found is not None else len(self.request_handler_chains)
+        for position, chain in dynamic:
+            if position > last_position:
+                break
+            if chain.request_handler.can_handle(handler_input=handler_input):
+                return chain
+        return found[1] if found is not None else None
+
+
+class RoutingSkillBuilder(SkillBuilder):
+    """
+    Skill builder using the RoutingRequestMapper, and the TimedHandlerAdapter to record the handlers duration.
+    The skill is built once, on first request, and reused by the following ones: registering a component
+    afterwards builds it again.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._skill = None
+
+    @property
+    def skill_configuration(self):
+        skill_configuration = super().skill_configuration
+        skill_configuration.request_mappers = [
+            RoutingRequestMapper(request_handler_chains=mapper.request_handler_chains)
+            for mapper in skill_configuration.request_mappers]
+        skill_configuration.handler_adapters = [TimedHandlerAdapter()]
+        return skill_configuration
+
+    @property
+    def skill(self):
+        """ Returns the skill, built on first use """
+        if self._skill is None:
+            skill = CustomSkill(skill_configuration=self.skill_configuration)
+            for mapper in skill.request_dispatcher.request_mappers:
+                mapper.build_routing_table()
+            self._skill = skill
+        return self._skill
+
+    def create(self):
+        return self.skill
+
+    def lambda_handler(self):
+        def wrapper(event, context):
+            skill = self.skill
+            request_envelope = skill.serializer.deserialize(payload=json.dumps(event), obj_type=RequestEnvelope)
+            response_envelope = skill.invoke(request_envelope=request_envelope, context=context)
+            return skill.serializer.serialize(response_envelope)
+        return wrapper
+
+    def add_request_handler(self, request_handler):
+        super().add_request_handler(request_handler)
+        self._skill = None
+
+    def add_exception_handler(self, exception_handler):
+        super().add_exception_handler(exception_handler)
+        self._skill = None
+
+    def add_global_request_interceptor(self, request_interceptor):
+        super().add_global_request_interceptor(request_interceptor)
+        self._skill = None
+
+    def add_global_response_interceptor(self, response_interceptor):
+        super().add_global_response_interceptor(response_interceptor)
+        self._skill = None
@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP endpoint mode: serves the skill of lambda_function from a long-lived process, as an Alexa HTTPS endpoint
+(behind a TLS terminating proxy) or for local tests, so warm hosts never pay a lambda cold start.
+Requests are served by a pool of worker threads, optionally in several forked processes sharing the listening socket,
+with HTTP/1.1 keep-alive: idle connections are watched by a single selector thread and only the connections with
+a request to read are handed to the workers, so idle clients never hold a worker.
+On SIGTERM or SIGINT the server stops accepting requests, finishes the ones in progress and writes the buffered
+analytics and metrics before exiting.
+
+Request signatures are verified with the ask-sdk-webservice-support package of requirements/server.txt, that is
+required unless verification is disabled with --no-verify (or SERVER_VERIFY_SIGNATURE=False), for local tests only.
+
+Usage, from the lambda/py folder: python -m alexa.server [--port N] [--workers N] [--processes N] [--no-verify]
+"""
+import argparse
+import json
+import logging
+import os
+import selectors
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+SKILL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HOST = os.environ.get("SERVER_HOST", "0.0.0.0")
+PORT = int(os.environ.get("SERVER_PORT", 8080))
+PATH = os.environ.get("SERVER_PATH", "/")
+WORKERS = int(os.environ.get("SERVER_WORKERS", 8))  # threads per process, each serves one request at a time
+PROCESSES = int(os.environ.get("SERVER_PROCESSES", 1))
+VERIFY_SIGNATURE = os.environ.get("SERVER_VERIFY_SIGNATURE", 'True') == 'True'
+KEEPALIVE_TIMEOUT = float(os.environ.get("SERVER_KEEPALIVE_TIMEOUT", 75))  # seconds an idle connection is kept open
+REQUEST_TIMEOUT = float(os.environ.get("SERVER_REQUEST_TIMEOUT", 10))  # seconds to receive a request once it started
+SHUTDOWN_TIMEOUT = float(os.environ.get("SERVER_SHUTDOWN_TIMEOUT", 10))  # seconds to write buffered analytics
+MAX_BODY = 128 * 1024  # bytes, Alexa requests are far smaller
+
+
+def load_skill():
+    """ Imports the skill, once per process: forked workers share the catalogs and templates loaded at import """
+    if SKILL_DIR not in sys.path:
+        sys.path.insert(0, SKILL_DIR)
+    import lambda_function
+    return lambda_function
+
+
+def load_verifiers():
+    """ Signature and timestamp verifiers of the ask-sdk-webservice-support package """
+    try:
+        from ask_sdk_webservice_support.verifier import RequestVerifier, TimestampVerifier
+    except ImportError:
+        raise RuntimeError("Request verification needs the ask-sdk-webservice-support package, install "
+                           "requirements/server.txt or disable the verification for local tests")
+    return [RequestVerifier(), TimestampVerifier()]
+
+
+class VerificationFailed(Exception):
+    """ The request signature or timestamp is not valid """
+
+
+class SkillRequestHandler(BaseHTTPRequestHandler):
+    """
+    Dispatches the Alexa requests POSTed to PATH to the skill.
+    Created once per connection by the server, every call of handle() serves a single request.
+    """
+    protocol_version = "HTTP/1.1"
+    timeout = REQUEST_TIMEOUT
+    disable_nagle_algorithm = True  # headers and body are separate writes, don't wait for the ack in between
+
+    def __init__(self, request, client_address, server):
+        # Unlike BaseRequestHandler, don't serve the connection here: the server calls handle() when a request arrives
+        self.request = request
+        self.client_address = client_address
+        self.server = server
+        self.setup()
+
+    def handle(self):
+        self.close_connection = True  # kept open by handle_one_request for a valid HTTP/1.1 request
+        self.handle_one_request()
+
+    def has_buffered_request(self):
+        """ Whether the next request was already received, e.g. read ahead in the input buffer with the previous one """
+        self.connection.setblocking(False)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send(200, b"ok", "text/plain")
+        else:
+            self._send(404, b"", "text/plain")
+
+    def do_POST(self):
+        if self.path != self.server.path:
+            self._send(404, b"", "text/plain")
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        if length <= 0 or length > MAX_BODY:
+            self._send(400, b"", "text/plain")
+            return
+        body = self.rfile.read(length).decode('utf-8')
+        try:
+            response = self.server.dispatch(self.headers, body)
+        except VerificationFailed as e:
+            logger.warning("Request verification failed: {}".format(e))
+            self._send(400, b"", "text/plain")
+            return
+        except Exception as e:
+            logger.error("Request failed: {}".format(e).replace("\n", "\r"))
+            self._send(500, b"", "text/plain")
+            return
+        self._send(200, json.dumps(response, separators=(',', ':')).encode('utf-8'), "application/json")
+
+    def _send(self, status, body, content_type):
+        if self.server.stopping:
+            self.close_connection = True
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+class SkillHTTPServer(HTTPServer):
+    """ HTTP server dispatching the requests to a fixed pool of worker threads, idle connections wait in a selector """
+
+    def __init__(self, address, skill, workers=WORKERS, verify_signature=VERIFY_SIGNATURE, path=PATH,
+                 sock=None):
+        super().__init__(address, SkillRequestHandler, bind_and_activate=sock is None)
+        if sock is not None:
+            self.socket.close()
+            self.socket = sock
+            self.server_address = sock.getsockname()
+        self.skill = skill
+        self.path = path
+        self.verifiers = load_verifiers() if verify_signature else []
+        self.stopping = False
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="server")
+        self._selector = selectors.DefaultSelector()
+        self._wakeup, self._wakeup_sender = socket.socketpair()
+        self._selector.register(self._wakeup, selectors.EVENT_READ)
+        self._lock = threading.Lock()
+        self._waiting = []  # connections to watch, only the watcher thread changes the selector
+        self._watching = True
+        self._watcher = threading.Thread(target=self._watch, name="server-idle", daemon=True)
+        self._watcher.start()
+
+    def dispatch(self, headers, body):
+        """ Runs the skill on a serialized request envelope, returns the response envelope as a dict """
+        from alexa import metrics
+        from alexa.analytics import analytics_rollup
+        if self.verifiers:
+            from ask_sdk_model import RequestEnvelope
+            envelope = self.skill.sb.skill.serializer.deserialize(payload=body, obj_type=RequestEnvelope)
+            try:
+                for verifier in self.verifiers:
+                    verifier.verify(headers=headers, serialized_request_env=body, deserialized_request_env=envelope)
+            except Exception as e:
+                raise VerificationFailed(str(e))
+        # Analytics are written by the background writer as they come and the rollups due on the shared thread pool,
+        # no flush waited for per request as on AWS lambda
+        try:
+            return self.skill.skill_handler(json.loads(body), None)
+        finally:
+            metrics.finish_request()
+            analytics_rollup.flush_if_due(background=True)
+
+    def process_request(self, request, client_address):
+        # A new connection waits for its first request like an idle one, a slow client doesn't hold a worker
+        self._wait(self.RequestHandlerClass(request, client_address, self))
+
+    def _wait(self, handler):
+        """ Hands a connection to the watcher thread, that submits it to the workers when a request arrives """
+        with self._lock:
+            if self._watching:
+                self._waiting.append(handler)
+                handler = None
+        if handler is not None:
+            self._close(handler)
+        else:
+            self._wakeup_sender.send(b"\0")
+
+    def _watch(self):
+        """ Watcher thread: submits the readable connections to the workers, closes the ones idle for too long """
+        deadlines = {}
+        while True:
+            for key, _ in self._selector.select(timeout=1):
+                if key.fileobj is self._wakeup:
+                    self._wakeup.recv(4096)
+                    continue
+                self._selector.unregister(key.fileobj)
+                del deadlines[key.data]
+                self._executor.submit(self._serve, key.data)
+            with self._lock:
+                waiting, self._waiting = self._waiting, []
+                watching = self._watching
+            for handler in waiting:
+                self._selector.register(handler.connection, selectors.EVENT_READ, handler)
+                deadlines[handler] = time.monotonic() + KEEPALIVE_TIMEOUT
+            now = time.monotonic()
+            for handler, deadline in list(deadlines.items()):
+                if not watching or deadline <= now:
+                    self._selector.unregister(handler.connection)
+                    del deadlines[handler]
+                    self._close(handler)
+            if not watching:
+                return
+
+    def _serve(self, handler):
+        """ Worker: serves the requests received on the connection, then hands it back to the watcher """
+        try:
+            while True:
+                handler.handle()
+                if handler.close_connection or self.stopping:
+                    break
+                if not handler.has_buffered_request():
+                    self._wait(handler)
+                    return
+        except Exception:
+            self.handle_error(handler.request, handler.client_address)
+        self._close(handler)
+
+    def _close(self, handler):
+        try:
+            handler.finish()
+        except OSError:
+            pass
+        self.shutdown_request(handler.request)
+
+    def stop(self):
+        """ Stops accepting connections, closes the idle ones and waits for the requests in progress """
+        self.stopping = True
+        self.shutdown()
+        with self._lock:
+            self._watching = False
+        self._wakeup_sender.send(b"\0")
+        self._watcher.join()
+        self._executor.shutdown(wait=True)
+        self.server_close()
+
+    def server_close(self):
+        super().server_close()
+        self._selector.close()
+        self._wakeup.close()
+        self._wakeup_sender.close()
+
+
+def flush_buffers(timeout=SHUTDOWN_TIMEOUT):
+    """ Writes everything still buffered by the skill, called before the process exits """
+    from alexa import metrics
+    from alexa.analytics import analytics_writer, analytics_rollup
+    from alexa.profiling import profiler
+    analytics_writer.flush(timeout=timeout)
+    analytics_rollup.flush()
+    if metrics.METRICS_AGGREGATE:
+        metrics.aggregator.emit()
+    if profiler.enabled:
+        profiler.write_report()
+
+
+def serve(server):
+    """ Serves until SIGTERM or SIGINT, then shuts down gracefully """
+    stopping = []
+
+    def request_stop(signum, frame):
+        if not stopping:
+            logger.info("Signal {} received, shutting down".format(signum))
+            # shutdown() waits for serve_forever to return, so it can't run in the thread serving
+            stopping.append(threading.Thread(target=server.stop, name="server-stop"))
+            stopping[0].start()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+    server.serve_forever()
+    stopping[0].join()
+    flush_buffers()
+
+
+def run(host=HOST, port=PORT, workers=WORKERS, processes=PROCESSES, verify_signature=VERIFY_SIGNATURE, path=PATH):
+    skill = load_skill()
+    if processes <= 1:
+        server = SkillHTTPServer((host, port), skill, workers, verify_signature, path)
+        logger.info("Serving the skill on {}:{}{} with {} workers".format(
+            host, server.server_address[1], path, workers))
+        serve(server)
+        return
+
+    # The socket is bound before forking, so the worker processes share it and the kernel spreads the connections
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(128)
+    children = []
+    for _ in range(processes):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                serve(SkillHTTPServer((host, port), skill, workers, verify_signature, path, sock=sock))
+            finally:
+                os._exit(0)
+        children.append(pid)
+    logger.info("Serving the skill on {}:{}{} with {} processes of {} workers".format(
+        host, port, path, processes, workers))
+
+    def forward(signum, frame):
+        for child in children:
+            try:
+                os.kill(child, signal.SIGTERM)
+            except OSError:
+                pass
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    for child in children:
+        os.waitpid(child, 0)
+    sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--path", default=PATH, help="path the requests are POSTed to")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="worker threads per process")
+    parser.add_argument("--processes", type=int, default=PROCESSES, help="forked worker processes")
+    parser.add_argument("--no-verify", action="store_true",
+                        help="don't verify the request signatures, local tests only")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    run(args.host, args.port, args.workers, args.processes, VERIFY_SIGNATURE and not args.no_verify, args.path)
+
+
+if __name__ == '__main__':
+    main()
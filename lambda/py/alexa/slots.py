@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import logging
+from collections import namedtuple
+from ask_sdk_model.slu.entityresolution import StatusCode
+from alexa import entity_index
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+# This file collects the slot resolution of the skill. Resolutions are immutable records built for each request,
+# so handlers, that are shared by every request of the container, don't keep any slot state.
+# Values Alexa couldn't match (ER_SUCCESS_NO_MATCH) are looked up in the offline entity index of the locale,
+# see alexa/entity_index.py, when the intent and the locale are known.
+
+
+class ResolvedSlot(namedtuple("ResolvedSlot", ["synonym", "resolved", "resolved_id", "is_validated"])):
+    """
+    Resolution of a slot: what the user said (synonym), the canonical value and id found by entity resolution
+    (the raw value and None when it was not resolved), and whether the value was validated.
+    """
+    __slots__ = ()
+
+
+UNRESOLVED = ResolvedSlot(synonym=None, resolved=None, resolved_id=None, is_validated=False)
+
+
+def resolve_slot(slot_item, intent_name=None, locale=None):
+    """ Returns the ResolvedSlot of a slot of the request, None if entity resolution returned another status """
+    try:
+        resolution = slot_item.resolutions.resolutions_per_authority[0]
+        status_code = resolution.status.code
+
+        if status_code == StatusCode.ER_SUCCESS_MATCH:
+            value = resolution.values[0].value
+            return ResolvedSlot(slot_item.value, value.name, value.id, True)
+        elif status_code != StatusCode.ER_SUCCESS_NO_MATCH:
+            return None
+    except (AttributeError, ValueError, KeyError, IndexError, TypeError):
+        # for BUILT-IN intents, there are no resolutions, but the value is specified
+        is_validated = slot_item.value is not None and slot_item.value != 'NONE'
+        return ResolvedSlot(slot_item.value, slot_item.value, None, is_validated)
+
+    # ER_SUCCESS_NO_MATCH: the value may still be found in the local entity index
+    if intent_name is not None and locale is not None:
+        try:
+            match = entity_index.resolve_slot(locale, intent_name, slot_item.name, slot_item.value)
+        except Exception as e:
+            # a broken index must not validate the value
+            logger.error("Local resolution of slot {} failed: {}".format(slot_item.name, e).replace("\n", "\r"))
+            match = None
+        if match is not None:
+            logger.debug("Slot {} resolved locally ({}): {}".format(slot_item.name, match.match_type, match.id))
+            return ResolvedSlot(slot_item.value, match.name, match.id, True)
+    return ResolvedSlot(slot_item.value, slot_item.value, None, False)
+
+
+class SlotResolver(object):
+    """ Resolver of the slots of a handler, built once from its SLOTS and safe to share between threads """
+    __slots__ = ("slot_names", "_defaults")
+
+    def __init__(self, slot_names):
+        self.slot_names = tuple(slot_names)
+        self._defaults = {name: UNRESOLVED for name in self.slot_names}
+
+    def resolve(self, filled_slots, intent_name=None, locale=None):
+        """
+        Returns {slot name: ResolvedSlot} for the slots of the handler and the ones filled in the request,
+        unmatched values are resolved with the entity index when intent_name and locale are given
+        """
+        if filled_slots is None:
+            return {}
+        slot_values = dict(self._defaults)
+        for slot_item in filled_slots.values():
+            resolved_slot = resolve_slot(slot_item, intent_name, locale)
+            if resolved_slot is not None:
+                slot_values[slot_item.name] = resolved_slot
+        return slot_values
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Startup report of the skill: how much each module costs to import and each handler to construct.
+The import of lambda_function is run in a fresh interpreter with -X importtime, the same way a cold start does,
+then handlers are constructed again in this process to time them.
+
+Usage, from the lambda/py folder: python -m alexa.startup [--top N] [--json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+SKILL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENTRY_MODULE = "lambda_function"
+
+
+def import_times(module=ENTRY_MODULE):
+    """ Imports a module in a fresh interpreter, returns [(module, self us, cumulative us)] in import order """
+    env = dict(os.environ)
+    env.setdefault("AWS_DEFAULT_REGION", "eu-west-1")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import {}".format(module)],
+                            cwd=SKILL_DIR, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            universal_newlines=True, check=True)
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        times.append((name.strip(), int(self_us), int(cumulative_us)))
+    return times
+
+
+def handler_construction_times():
+    """ Constructs again every component registered in the skill builder, returns [(class name, us)] """
+    sys.path.insert(0, SKILL_DIR)
+    import lambda_function
+    builder = lambda_function.sb.runtime_configuration_builder
+    components = [chain.request_handler for chain in builder.request_handler_chains] + \
+        builder.exception_handlers + builder.global_request_interceptors + builder.global_response_interceptors
+    times = []
+    for component in components:
+        component = getattr(component, 'interceptor', component)  # the interceptor wrapped by timed()
+        start = time.perf_counter()
+        type(component)()
+        times.append((type(component).__name__, int((time.perf_counter() - start) * 1e6)))
+    return times
+
+
+def skill_build_time():
+    """ Builds the skill and its routing table, as done by the first request, returns us """
+    import lambda_function
+    lambda_function.sb._skill = None
+    start = time.perf_counter()
+    lambda_function.sb.create()
+    return int((time.perf_counter() - start) * 1e6)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=20, help="slowest modules to show")
+    parser.add_argument("--json", action="store_true", help="print the full report as json")
+    args = parser.parse_args()
+
+    imports = import_times()
+    handlers = handler_construction_times()
+    build = skill_build_time()
+    total = next((cumulative for name, _, cumulative in imports if name == ENTRY_MODULE), 0)
+
+    if args.json:
+        print(json.dumps({
+            "import_total_us": total,
+            "imports": [{"module": name, "self_us": self_us, "cumulative_us": cumulative_us}
+                        for name, self_us, cumulative_us in imports],
+            "handlers": [{"handler": name, "construction_us": us} for name, us in handlers],
+            "skill_build_us": build,
+        }, indent=2))
+        return
+
+    print("Import of {}: {:.1f} ms".format(ENTRY_MODULE, total / 1000))
+    print("\nSlowest modules (cumulative, self) [ms]:")
+    for name, self_us, cumulative_us in sorted(imports, key=lambda item: -item[2])[:args.top]:
+        print("  {:>8.1f} {:>8.1f}  {}".format(cumulative_us / 1000, self_us / 1000, name))
+    print("\nHandler construction [ms]:")
+    for name, us in handlers:
+        print("  {:>8.3f}  {}".format(us / 1000, name))
+    print("\nSkill and routing table build (first request): {:.1f} ms".format(build / 1000))
+
+
+if __name__ == '__main__':
+    main()
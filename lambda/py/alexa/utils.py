@@ -1,39 +1,51 @@
 # -*- coding: utf-8 -*-
 import logging
-from html.parser import HTMLParser
+import os
+import re
+from functools import lru_cache
+from html import unescape
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
 # This file should collect every util function used throughout the skill project
 
+SSML_CACHE_SIZE = int(os.environ.get("SSML_CACHE_SIZE", 1024))
 
-class SSMLStripper(HTMLParser):
-    """ ----------- Convert SSML to Card text -----------
-    This is for automatic conversion of ssml to text content on simple card
-    You can create your own simple cards for each response, if this is not
-    what you want to use.
-    """
-
-    def error(self, message):
-        raise NotImplementedError
-
-    def __init__(self):
-        super().__init__()
-        self.reset()
-        self.full_str_list = []
-        self.strict = False
-        self.convert_charrefs = True
-
-    def handle_data(self, d):
-        self.full_str_list.append(d)
-
-    def get_data(self):
-        return ''.join(self.full_str_list)
+# A token is either a tag (with quoted attribute values that may contain '>'), a run of text, or a stray '<'
+_SSML_TOKEN = re.compile(r'<(/?)([a-zA-Z][\w:.-]*)((?:[^>"\']|"[^"]*"|\'[^\']*\')*?)(/?)>|([^<]+)|(<)')
+_SSML_ALIAS = re.compile(r'\balias\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+# Tags separating words or sentences, replaced by a space so the surrounding words don't get glued together
+_SSML_SEPARATORS = frozenset(("break", "p", "s"))
 
 
+@lru_cache(maxsize=SSML_CACHE_SIZE)
 def convert_speech_to_text(ssml_speech):
-    """convert ssml speech to text, by removing html tags."""
-    s = SSMLStripper()
-    s.feed(ssml_speech)
-    return s.get_data()
+    """
+    ----------- Convert SSML to Card text -----------
+    This is for automatic conversion of ssml to text content on simple card, in a single pass over the ssml:
+    tags are removed, <sub alias="..."> is replaced by its alias, <break>, <p> and <s> become spaces
+    and entities are unescaped. Results are memoized, since translated prompts are highly repetitive.
+    You can create your own simple cards for each response, if this is not what you want to use.
+    """
+    if not ssml_speech:
+        return ssml_speech
+    parts = []
+    in_sub_alias = False
+    for closing, tag, attributes, self_closing, text, stray in _SSML_TOKEN.findall(ssml_speech):
+        if in_sub_alias:
+            # The content of a <sub> is spoken as its alias, skipping it until the closing tag
+            in_sub_alias = not (closing and tag.lower() == "sub")
+        elif text or stray:
+            parts.append(unescape(text) if text else stray)
+        else:
+            tag = tag.lower()
+            if tag in _SSML_SEPARATORS:
+                if parts and not parts[-1][-1:].isspace():
+                    parts.append(" ")
+            elif tag == "sub" and not closing:
+                alias = _SSML_ALIAS.search(attributes)
+                if alias is not None:
+                    parts.append(unescape(alias.group(1) if alias.group(1) is not None else alias.group(2)))
+                    in_sub_alias = not self_closing
+    return ''.join(parts).strip()
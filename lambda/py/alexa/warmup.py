@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+import time
+from alexa import localization, metrics, persistence
+from alexa.concurrency import get_executor
+from alexa.responses import response_templates
+from alexa.utils import convert_speech_to_text
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+# This file collects the handling of the warm-up pings, e.g. a scheduled EventBridge rule invoking the lambda:
+# they don't go through the skill, they initialize what the first real request would otherwise pay for
+# and report how long it took.
+
+# Sources of the scheduled warm-up events, events with "warmup": true are warm-up pings too
+WARMUP_SOURCES = [source.strip() for source in
+                  os.environ.get("WARMUP_SOURCES", "aws.events,serverless-plugin-warmup").split(",") if source.strip()]
+
+
+def is_warmup_event(event):
+    """ Whether the lambda event is a warm-up ping instead of an Alexa request """
+    if not isinstance(event, dict) or "request" in event:
+        return False
+    return event.get("warmup") is True or event.get("source") in WARMUP_SOURCES
+
+
+def _connect_dynamodb():
+    """ Creates the DynamoDB client and opens a pooled connection with a cheap read """
+    table_name = persistence.USER_TABLE_NAME
+    if not table_name:
+        persistence.get_dynamodb_resource()
+        return
+    persistence.get_table(table_name).get_item(Key={"user_id": "warmup"})
+
+
+def _fill_ssml_cache():
+    """ Converts every translated message to card text, as the AddCardInterceptor does """
+    for locale in localization.available_locales():
+        # The card title is converted bare, the content is the output speech, wrapped by the response builder
+        convert_speech_to_text(localization.get_translator(locale)("SKILL_NAME"))
+        catalog = getattr(localization.get_translation(locale), '_catalog', {})
+        for message in catalog.values():
+            if isinstance(message, str):
+                convert_speech_to_text("<speak>{}</speak>".format(message))
+
+
+def warm_up(skill_builder):
+    """ Initializes the state shared by the requests, returns the time of every step in milliseconds """
+    steps = [
+        ("dynamodb", _connect_dynamodb),
+        ("catalogs", localization.preload_catalogs),
+        ("ssml", _fill_ssml_cache),
+        ("responses", response_templates.preload),
+        ("routing", lambda: skill_builder.skill),  # the skill is built with its routing table
+        ("threads", get_executor),
+    ]
+    metrics.start_request("warmup")
+    report = {}
+    start = time.perf_counter()
+    for name, step in steps:
+        step_start = time.perf_counter()
+        try:
+            with metrics.phase("warmup." + name):
+                step()
+        except Exception as e:
+            # a failed step is paid by the first request, as without warm-up
+            logger.error("Warm-up of {} failed: {}".format(name, e).replace("\n", "\r"))
+        report[name] = round((time.perf_counter() - step_start) * 1000, 3)
+    report["total"] = round((time.perf_counter() - start) * 1000, 3)
+    metrics.finish_request()
+    logger.info("Warm-up done in {} ms: {}".format(report["total"], report))
+    return {"warmup": True, "initialization_ms": report}
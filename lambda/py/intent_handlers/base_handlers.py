@@ -1,14 +1,15 @@
 # -*- coding: utf-8 -*-
 import logging
-import six
 import os
-import boto3
-from ask_sdk_dynamodb.adapter import DynamoDbAdapter
-from ask_sdk_core.dispatch_components import AbstractRequestHandler, AbstractRequestInterceptor
-from abc import abstractmethod
-from ask_sdk_model.slu.entityresolution import StatusCode
+from ask_sdk_core.dispatch_components import AbstractRequestHandler, AbstractRequestInterceptor, \
+    AbstractResponseInterceptor
 from ask_sdk_core.exceptions import PersistenceException
-from ask_sdk_dynamodb.adapter import user_id_partition_keygen
+from alexa import persistence
+from alexa.persistence import user_id_partition_keygen
+from alexa.analytics import analytics_writer, analytics_rollup, raw_sampled
+from alexa.metrics import phase
+from alexa.slots import SlotResolver
+from alexa.attributes import get_user_attributes, REQUEST_ATTRIBUTE_KEY
 import time
 
 logger = logging.getLogger(__name__)
@@ -27,110 +28,93 @@ class BaseRequestHandler(AbstractRequestHandler):
     This data can be both user data and analytics data
     """
     SLOTS = []  # Filled in every handler
+    REQUEST_TYPES = ()  # Request types handled, e.g. ("LaunchRequest",)
+    INTENT_NAMES = ()  # Intent names handled when the request is an IntentRequest, e.g. ("AMAZON.HelpIntent",)
+    USES_USER_ATTRIBUTES = False  # If True, user attributes are read in background while the analytics are saved
 
     def __init__(self):
         super().__init__()
-        self.slot_values = {}
-        # Initializing an empty dict, to read slots later
-        for slot_key in self.SLOTS:
-            self.slot_values[slot_key] = {
-                "synonym": None,
-                "resolved": None,
-                "is_validated": False,
-            }
-        self.dynamodb = boto3.resource('dynamodb',
-                                       region_name="eu-west-1",
-                                       aws_access_key_id="",
-                                       aws_secret_access_key="")  # TODO add here AWS keys
-        # Default partition keygen uses user_id in request_envelope as ID
-        table_name = None  # TODO user attributes table name
-        self.dynamo_client = DynamoDbAdapter(table_name=table_name,
-                                             partition_key_name="user_id",
-                                             partition_keygen=user_id_partition_keygen,  # default
-                                             create_table=False,  # default
-                                             dynamodb_resource=self.dynamodb)
-
-    @abstractmethod
+        # Resolver built once from SLOTS, slot values are returned by get_slot_values for each request
+        self.slot_resolver = SlotResolver(self.SLOTS)
+
+    @property
+    def dynamodb(self):
+        """ DynamoDB resource shared by every handler of the container """
+        return persistence.get_dynamodb_resource()
+
+    @property
+    def dynamo_client(self):
+        """ User attributes adapter, default partition keygen uses user_id in request_envelope as ID """
+        return persistence.get_adapter(table_name=persistence.USER_TABLE_NAME,
+                                       partition_key_name="user_id",
+                                       partition_keygen=user_id_partition_keygen)
+
     def can_handle(self, handler_input):
-        """ Base method, not implemented here """
-        raise NotImplementedError
+        """
+        Base method, checks the request against REQUEST_TYPES and INTENT_NAMES.
+        Override it for handlers that depend on something else, they won't be indexed in the routing table
+        """
+        request = handler_input.request_envelope.request
+        if request.object_type in self.REQUEST_TYPES:
+            return True
+        return request.object_type == "IntentRequest" and request.intent.name in self.INTENT_NAMES
+
+    @classmethod
+    def routes(cls):
+        """ Returns the (request type, intent name) keys used to index this handler in the routing table """
+        if cls.can_handle is not BaseRequestHandler.can_handle:
+            return []
+        return [(request_type, None) for request_type in cls.REQUEST_TYPES] + \
+               [("IntentRequest", intent_name) for intent_name in cls.INTENT_NAMES]
 
     def handle(self, handler_input):
         """ Super handler, called by every intent that wants to save request data """
-        BaseRequestInterceptor().process(handler_input=handler_input, request_handler=self)
+        if self.USES_USER_ATTRIBUTES:
+            get_user_attributes(handler_input).prefetch()
+        with phase("analytics"):
+            analytics_interceptor.process(handler_input=handler_input, request_handler=self)
 
     def get_attributes(self, handler_input):
-        """ Gets user attributes from DynamoDB """
-        user_attr = self.dynamo_client.get_attributes(request_envelope=handler_input.request_envelope)
-        if len(user_attr) == 0:
-            # If the user didn't exist, we create a default set of attributes with the key 'first_use' to signal it
+        """ Gets user attributes, read from DynamoDB at most once per request """
+        user_attributes = get_user_attributes(handler_input)
+        if not user_attributes.exists and not user_attributes.defaults_applied:
+            # If the user didn't exist, we create a default set of attributes with the key 'first_use' to signal it.
+            # Later calls in the same request see the defaults and the changes, as if the user was already saved
             default_attr = self.set_default_attributes(handler_input)
+            user_attributes.defaults_applied = True
             default_attr['first_use'] = True
             return default_attr
-        return user_attr
+        return user_attributes.get()
 
     def set_default_attributes(self, handler_input):
-        """ Sets default user attributes to DynamoDB """
+        """ Sets default user attributes, saved to DynamoDB at the end of the request """
         attr = {
             'custom_attr': 'TODO',
         }
-        self.dynamo_client.save_attributes(request_envelope=handler_input.request_envelope, attributes=attr)
-        return attr
+        get_user_attributes(handler_input).update(attr)
+        return dict(attr)
 
     def set_attributes(self, handler_input, attr):
-        """ Overwrite user attributes to DynamoDB """
-        user_attr = self.dynamo_client.get_attributes(request_envelope=handler_input.request_envelope)
-        for changed_attr in attr:
-            user_attr[changed_attr] = attr[changed_attr]
-        self.dynamo_client.save_attributes(request_envelope=handler_input.request_envelope,
-                                           attributes=user_attr)
+        """ Overwrite user attributes, only the changed ones are saved to DynamoDB at the end of the request """
+        get_user_attributes(handler_input).update(attr)
 
     # --------- Other methods
 
-    def get_slot_values(self, filled_slots):
-        """ Return slot values with additional info, to understand if the slots were filled """
+    def get_slot_values(self, filled_slots, intent_name=None, locale=None):
+        """
+        Return slot values with additional info, to understand if the slots were filled:
+        a dict of slot name to ResolvedSlot (synonym, resolved, resolved_id, is_validated), built for each request.
+        With intent_name and locale, values not matched by Alexa are resolved with the offline entity index
+        """
         if DEBUG:
             logger.info("Filled slots: {}".format(filled_slots).replace("\n", "\r"))
 
-        if filled_slots is None:
-            return {}
-
-        for key, slot_item in six.iteritems(filled_slots):
-            name = slot_item.name
-            try:
-                status_code = slot_item.resolutions.resolutions_per_authority[0].status.code
-
-                if status_code == StatusCode.ER_SUCCESS_MATCH:
-                    self.slot_values[name] = {
-                        "synonym": slot_item.value,
-                        "resolved": slot_item.resolutions.resolutions_per_authority[0].values[0].value.__dict__,
-                        "is_validated": True,
-                    }
-                elif status_code == StatusCode.ER_SUCCESS_NO_MATCH:
-                    self.slot_values[name] = {
-                        "synonym": slot_item.value,
-                        "resolved": slot_item.value,
-                        "is_validated": False,
-                    }
-                else:
-                    pass
-            except (AttributeError, ValueError, KeyError, IndexError, TypeError) as e:
-                # for BUILT-IN intents, there are no resolutions, but the value is specified
-                if slot_item.value is not None and slot_item.value != 'NONE':
-                    self.slot_values[name] = {
-                        "synonym": slot_item.value,
-                        "resolved": slot_item.value,
-                        "is_validated": True,
-                    }
-                else:
-                    if DEBUG:
-                        logger.info("SLOT {} UNRESOLVED".format(name))
-                    self.slot_values[name] = {
-                        "synonym": slot_item.value,
-                        "resolved": slot_item.value,
-                        "is_validated": False,
-                    }
-        return self.slot_values
+        slot_values = self.slot_resolver.resolve(filled_slots, intent_name, locale)
+        if DEBUG:
+            for name, slot in slot_values.items():
+                if not slot.is_validated:
+                    logger.info("SLOT {} UNRESOLVED".format(name))
+        return slot_values
 
 
 def request_id_partition_keygen(request_envelope):
@@ -144,31 +128,34 @@ def request_id_partition_keygen(request_envelope):
 
 
 class BaseRequestInterceptor(AbstractRequestInterceptor):
-    def __init__(self):
-        super().__init__()
-        table_name = ""  # TODO add request analysis dynamodb table name
-        self.dynamodb = boto3.resource('dynamodb',
-                                       region_name="eu-west-1",
-                                       aws_access_key_id="",
-                                       aws_secret_access_key="")  # TODO add aws keys
-        self.dynamo_client = DynamoDbAdapter(
-            table_name,
-            partition_key_name="request_id",
-            partition_keygen=request_id_partition_keygen,
-            create_table=False,
-            dynamodb_resource=self.dynamodb
-        )
+    @property
+    def dynamodb(self):
+        """ DynamoDB resource shared by every handler of the container """
+        return persistence.get_dynamodb_resource()
+
+    @property
+    def dynamo_client(self):
+        """ Request analytics adapter, keyed by request id """
+        return persistence.get_adapter(table_name=persistence.ANALYTICS_TABLE_NAME,
+                                       partition_key_name="request_id",
+                                       partition_keygen=request_id_partition_keygen)
 
     def save_request(self, handler_input, payload):
-        self.dynamo_client.save_attributes(
-            request_envelope=handler_input.request_envelope,
-            attributes=payload)
+        """ Buffers the analytics payload, it is written in background and flushed before the invocation ends """
+        analytics_writer.enqueue(partition_key=request_id_partition_keygen(handler_input.request_envelope),
+                                 attributes=payload)
         return True
 
     def process(self, handler_input, request_handler=None):
         try:
             if hasattr(handler_input.request_envelope.request, 'intent'):
-                slots = request_handler.get_slot_values(handler_input.request_envelope.request.intent.slots)
+                request = handler_input.request_envelope.request
+                slots = request_handler.get_slot_values(request.intent.slots, request.intent.name, request.locale)
+
+                if analytics_rollup.enabled:
+                    analytics_rollup.add(request.intent.name, request.locale, slots)
+                if not raw_sampled():
+                    return
 
                 analytics_payload = {
                     "request_id": handler_input.request_envelope.request.request_id,
@@ -181,15 +168,15 @@ class BaseRequestInterceptor(AbstractRequestInterceptor):
                     'intent': handler_input.request_envelope.request.intent.name,
                 }
 
-                for slot in slots:
-                    analytics_resolved_key = "slot_{}_resolved_id".format(slot)
-                    analytics_synonym_key = "slot_{}_synonym".format(slot)
-                    analytics_is_valid_key = "slot_{}_is_validated".format(slot)
+                for name, slot in slots.items():
+                    analytics_resolved_key = "slot_{}_resolved_id".format(name)
+                    analytics_synonym_key = "slot_{}_synonym".format(name)
+                    analytics_is_valid_key = "slot_{}_is_validated".format(name)
 
                     analytics_payload.update({
-                        analytics_resolved_key: slots[slot]["resolved"]["id"] if isinstance(slots[slot]["resolved"], dict) and 'id' in slots[slot]["resolved"] else slots[slot]["resolved"],
-                        analytics_synonym_key: slots[slot]["synonym"],
-                        analytics_is_valid_key: slots[slot]["is_validated"]
+                        analytics_resolved_key: slot.resolved_id if slot.resolved_id is not None else slot.resolved,
+                        analytics_synonym_key: slot.synonym,
+                        analytics_is_valid_key: slot.is_validated
                     })
 
                 self.save_request(handler_input, analytics_payload)
@@ -199,3 +186,15 @@ class BaseRequestInterceptor(AbstractRequestInterceptor):
                 raise e
             else:
                 pass  # In production we can skip saving analytics if it fails
+
+
+class SaveUserAttributesInterceptor(AbstractResponseInterceptor):
+    """ Writes the user attributes changed during the request, with a single DynamoDB call """
+    def process(self, handler_input, response):
+        user_attributes = handler_input.attributes_manager.request_attributes.get(REQUEST_ATTRIBUTE_KEY)
+        if user_attributes is not None:
+            user_attributes.commit()
+
+
+# Single analytics interceptor shared by every handler, instead of building a new one for each request
+analytics_interceptor = BaseRequestInterceptor()
@@ -2,9 +2,9 @@
 import os
 import logging
 from ask_sdk_model.ui import LinkAccountCard, SimpleCard
-from ask_sdk_core.utils import is_request_type, is_intent_name
 from ask_sdk_core.handler_input import HandlerInput
 from ask_sdk_model import Response
+from alexa.responses import response_templates
 from . import BaseRequestHandler
 
 logger = logging.getLogger(__name__)
@@ -15,9 +15,8 @@ DEBUG = os.environ.get("DEBUG", False) == 'True'
 
 class LaunchRequestHandler(BaseRequestHandler):
     """ Handler for Skill Launch """
-    def can_handle(self, handler_input):
-        # type: (HandlerInput) -> bool
-        return is_request_type("LaunchRequest")(handler_input)
+    REQUEST_TYPES = ("LaunchRequest",)
+    USES_USER_ATTRIBUTES = True
 
     def handle(self, handler_input):
         # type: (HandlerInput) -> Response
@@ -27,7 +26,7 @@ class LaunchRequestHandler(BaseRequestHandler):
         _ = handler_input.attributes_manager.request_attributes["_"]  # Translator
         
         # ---------- Reading from Dynamo user data
-        user_attr = self.dynamo_client.get_attributes(request_envelope=handler_input.request_envelope)
+        user_attr = self.get_attributes(handler_input)
 
         if 'first_use' in user_attr:    # User not saved
             if DEBUG:
@@ -42,38 +41,41 @@ class LaunchRequestHandler(BaseRequestHandler):
         return handler_input.response_builder.response
 
 
+# --------- Static responses, they depend only on the locale and are built once per locale, see alexa/responses.py
+
+@response_templates.template("help")
+def help_response(_, response_builder):
+    speech_text = _("HELP")
+    return response_builder.speak(speech_text).ask(speech_text).response
+
+
+@response_templates.template("exit")
+def exit_response(_, response_builder):
+    return response_builder.speak(_("STOP")).response
+
+
+@response_templates.template("fallback")
+def fallback_response(_, response_builder):
+    return response_builder.speak(_("FALLBACK")).response
+
+
 class HelpIntentHandler(BaseRequestHandler):
     """ Handler for help intent """
-    def can_handle(self, handler_input):
-        # type: (HandlerInput) -> bool
-        return is_request_type("IntentRequest")(handler_input) and \
-               (is_intent_name("AMAZON.HelpIntent")(handler_input) or
-                is_intent_name("HelpIntent")(handler_input))
+    INTENT_NAMES = ("AMAZON.HelpIntent", "HelpIntent")
 
     def handle(self, handler_input):
         # type: (HandlerInput) -> Response
         if DEBUG:
             logger.info("INTENT CALLED: HelpIntent")
         super().handle(handler_input)
-        _ = handler_input.attributes_manager.request_attributes["_"]  # Translator
-
-        speech_text = _("HELP")
-        handler_input.response_builder.speak(speech_text).ask(speech_text)
-        return handler_input.response_builder.response
+        return response_templates.serve(handler_input, "help")
 
 
 class ExitIntentHandler(BaseRequestHandler):
     """Single Handler for Cancel, Stop and Pause intents."""
-    def can_handle(self, handler_input):
-        # type: (HandlerInput) -> bool
-        return is_request_type("SessionEndedRequest")(handler_input) or \
-               (is_request_type("IntentRequest")(handler_input) and
-                (is_intent_name("AMAZON.CancelIntent")(handler_input) or
-                 is_intent_name("AMAZON.StopIntent")(handler_input) or
-                 is_intent_name("AMAZON.PauseIntent")(handler_input) or
-                 is_intent_name("CancelIntent")(handler_input) or
-                 is_intent_name("StopIntent")(handler_input) or
-                 is_intent_name("PauseIntent")(handler_input)))
+    REQUEST_TYPES = ("SessionEndedRequest",)
+    INTENT_NAMES = ("AMAZON.CancelIntent", "AMAZON.StopIntent", "AMAZON.PauseIntent",
+                    "CancelIntent", "StopIntent", "PauseIntent")
 
     def handle(self, handler_input):
         # type: (HandlerInput) -> Response
@@ -84,27 +86,16 @@ class ExitIntentHandler(BaseRequestHandler):
             else:
                 logger.info("NO REASON SPECIFIED")
         super().handle(handler_input)
-        _ = handler_input.attributes_manager.request_attributes["_"]  # Translator
-
-        speech_text = _("STOP")
-        handler_input.response_builder.speak(speech_text)
-        return handler_input.response_builder.response
+        return response_templates.serve(handler_input, "exit")
 
 
 class FallbackIntentHandler(BaseRequestHandler):
     """ Handler for fallback intent, requests to this skill out of scope"""
-    def can_handle(self, handler_input):
-        # type: (HandlerInput) -> bool
-        return is_request_type("IntentRequest")(handler_input) and \
-                is_intent_name("AMAZON.FallbackIntent")(handler_input)
+    INTENT_NAMES = ("AMAZON.FallbackIntent",)
 
     def handle(self, handler_input):
         # type: (HandlerInput) -> Response
         if DEBUG:
             logger.info("INTENT CALLED: FallbackIntent")
         super().handle(handler_input)
-        _ = handler_input.attributes_manager.request_attributes["_"]  # Translator
-
-        speech_text = _("FALLBACK")
-        handler_input.response_builder.speak(speech_text)
-        return handler_input.response_builder.response
+        return response_templates.serve(handler_input, "fallback")
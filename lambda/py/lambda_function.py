@@ -1,12 +1,10 @@
 # -*- coding: utf-8 -*-
 import logging
 import os
-import gettext
 from ask_sdk_core.dispatch_components import AbstractRequestInterceptor, \
     AbstractResponseInterceptor
 from ask_sdk_core.handler_input import HandlerInput
 from ask_sdk_model import Response
-from ask_sdk_core.skill_builder import SkillBuilder
 from ask_sdk_model.ui import SimpleCard
 
 # necessary for local tests
@@ -15,22 +13,35 @@ os.environ["ASK_DEFAULT_DEVICE_LOCALE"] = "it-IT"
 os.environ["DEBUG"] = 'True'  # Debug variable, set to False once in production to avoid excessive logging
 
 from alexa.utils import convert_speech_to_text
+from alexa.localization import get_translator, preload_catalogs
+from alexa.responses import response_templates, STATIC_RESPONSE_KEY
+from alexa.analytics import flush_analytics
+from alexa.routing import RoutingSkillBuilder
+from alexa.log import log_model
+from alexa.dedup import DedupRequestInterceptor, DedupResponseInterceptor, DuplicateRequestHandler
+from alexa import metrics
+from alexa.profiling import profiler
+from alexa.warmup import is_warmup_event, warm_up
+from alexa.metrics import timed, TimingRequestInterceptor, TimingResponseInterceptor
 from intent_handlers import \
     LaunchRequestHandler, HelpIntentHandler, ExitIntentHandler, \
-    BaseRequestInterceptor, BaseRequestHandler, CatchAllExceptionHandler, FallbackIntentHandler
+    BaseRequestInterceptor, BaseRequestHandler, CatchAllExceptionHandler, FallbackIntentHandler, \
+    SaveUserAttributesInterceptor
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
 DEBUG = os.environ.get("DEBUG", False) == 'True'
 
-sb = SkillBuilder()
+sb = RoutingSkillBuilder()
 
 
 class AddCardInterceptor(AbstractResponseInterceptor):
     """ Add a card to every response by translating ssml text to card content """
     def process(self, handler_input, response):
         # type: (HandlerInput, Response) -> None
+        if handler_input.attributes_manager.request_attributes.get(STATIC_RESPONSE_KEY):
+            return  # Static responses are built with their card, see alexa/responses.py
 
         _ = handler_input.attributes_manager.request_attributes["_"]  # Translator
         # the attribute is always present but set to None withouth a card
@@ -52,17 +63,17 @@ class AddCardInterceptor(AbstractResponseInterceptor):
 
 # Request and Response loggers
 class RequestLogger(AbstractRequestInterceptor):
-    """ Log the alexa requests """
+    """ Log the alexa requests, as single-line json, see alexa/log.py for sampling and redaction """
     def process(self, handler_input):
         # type: (HandlerInput) -> None
-        logger.info("ALEXA REQUEST: {}".format(handler_input.request_envelope).replace('\n', '\r'))
+        log_model(handler_input, "request", handler_input.request_envelope)
 
 
 class ResponseLogger(AbstractResponseInterceptor):
-    """ Log the alexa responses """
+    """ Log the alexa responses, as single-line json, see alexa/log.py for sampling and redaction """
     def process(self, handler_input, response):
         # type: (HandlerInput, Response) -> None
-        logger.info("ALEXA RESPONSE: {}".format(response).replace('\n', '\r'))
+        log_model(handler_input, "response", response)
 
 
 # localizations support: https://github.com/alexa/skill-sample-python-city-guide/blob/master/instructions
@@ -74,12 +85,19 @@ class LocalizationInterceptor(AbstractRequestInterceptor):
         locale = handler_input.request_envelope.request.locale
         if DEBUG:
             logger.info("LOCALE = {}".format(locale))
-        i18n = gettext.translation('data', localedir='locales', languages=[locale], fallback=True)
-        handler_input.attributes_manager.request_attributes["_"] = i18n.gettext
+        handler_input.attributes_manager.request_attributes["_"] = get_translator(locale)
 
 
-# Add locale interceptor to the skill
-sb.add_global_request_interceptor(LocalizationInterceptor())
+# Start timing the request before any other interceptor, see alexa/metrics.py
+sb.add_global_request_interceptor(TimingRequestInterceptor())
+
+# Load every gettext catalog once per container, and add locale interceptor to the skill
+preload_catalogs()
+sb.add_global_request_interceptor(timed(LocalizationInterceptor()))
+
+# Answer the requests redelivered by Alexa with the response already sent, see alexa/dedup.py
+# (after the translator is set, so the exception handlers can always speak)
+sb.add_global_request_interceptor(timed(DedupRequestInterceptor()))
 
 # Register built-in handlers
 sb.add_request_handler(LaunchRequestHandler())
@@ -87,19 +105,44 @@ sb.add_request_handler(HelpIntentHandler())
 sb.add_request_handler(ExitIntentHandler())
 sb.add_request_handler(FallbackIntentHandler())
 
+# Build the static responses of the built-in handlers for every locale
+response_templates.preload()
+
 # Register intent handlers
-# TODO
+# TODO declare REQUEST_TYPES and INTENT_NAMES in each handler, so it is indexed in the routing table
 
 # Register exception handlers
+sb.add_exception_handler(DuplicateRequestHandler())
 sb.add_exception_handler(CatchAllExceptionHandler())
 
 # Add card interceptor to the skill
-sb.add_global_response_interceptor(AddCardInterceptor())
+sb.add_global_response_interceptor(timed(AddCardInterceptor()))
+
+# Save the user attributes changed by the handlers, once per request
+sb.add_global_response_interceptor(timed(SaveUserAttributesInterceptor()))
 
 # Add log interceptors to the skill
-sb.add_global_request_interceptor(RequestLogger())
-sb.add_global_response_interceptor(ResponseLogger())
+sb.add_global_request_interceptor(timed(RequestLogger()))
+sb.add_global_response_interceptor(timed(ResponseLogger()))
+
+# Keep the response for redeliveries of the request, after every interceptor changing it
+sb.add_global_response_interceptor(timed(DedupResponseInterceptor()))
+
+# Stop timing the dispatch after every other interceptor
+sb.add_global_response_interceptor(TimingResponseInterceptor())
+
+
+# Profiled on a sample of the invocations only if PROFILE_ENABLED or PROFILE_SAMPLE_RATE are set, see alexa/profiling.py
+skill_handler = profiler.wrap(sb.lambda_handler())
 
 
-# Handler name that is used on AWS lambda
-lambda_handler = sb.lambda_handler()
+def lambda_handler(event, context):
+    """ Handler name that is used on AWS lambda, buffered analytics are written before returning """
+    if is_warmup_event(event):
+        return warm_up(sb)
+    try:
+        return skill_handler(event, context)
+    finally:
+        with metrics.phase("analytics.flush"):
+            flush_analytics(context)
+        metrics.finish_request()
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+Codecs of the user attributes.
+
+Usage, from the repository root: python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+from decimal import Decimal
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'lambda', 'py'))
+
+from boto3.dynamodb.types import Binary  # noqa: E402
+from alexa.attribute_codecs import BinaryCodec, item_size  # noqa: E402
+
+
+class BinaryCodecTest(unittest.TestCase):
+
+    def test_dynamodb_types_round_trip(self):
+        """ Sets and binaries of items read from DynamoDB, stored as a blob or as a map """
+        attributes = {"tags": {"a", "b"}, "scores": {Decimal(1), Decimal("2.5")}, "avatar": Binary(b"\x00\x01"),
+                      "keys": {Binary(b"k1"), Binary(b"k2")}, "history": [{"at": Decimal("0.5")}], "count": Decimal(3)}
+        for threshold in (0, 2 ** 31):
+            codec = BinaryCodec(compress_threshold=threshold)
+            decoded = codec.decode(codec.encode(attributes))
+            self.assertEqual(decoded["tags"], {"a", "b"})
+            self.assertEqual(decoded["scores"], {1, Decimal("2.5")})
+            self.assertEqual(decoded["avatar"], b"\x00\x01")
+            self.assertEqual(decoded["keys"], {b"k1", b"k2"})
+            self.assertEqual(decoded["history"], [{"at": Decimal("0.5")}])
+            self.assertEqual(decoded["count"], 3)
+
+    def test_never_larger_than_the_map(self):
+        codec = BinaryCodec(compress_threshold=0)
+        small = {"first_use": False, "launch_count": Decimal(12), "locale": "it-IT"}
+        self.assertIs(codec.encode(small), small)
+        large = dict(small, history=[{"intent": "HelpIntent", "timestamp": Decimal(1700000000 + i)}
+                                     for i in range(300)])
+        encoded = codec.encode(large)
+        self.assertIsInstance(encoded, bytes)
+        self.assertLess(len(encoded), item_size(large))
+        self.assertEqual(codec.decode(encoded), large)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+User attributes of a request, on the in-memory DynamoDB stand-in of the benchmarks.
+
+Usage, from the repository root: python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'lambda', 'py'))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'benchmarks'))
+
+from fake_dynamodb import FakeDynamoDbResource  # noqa: E402
+from alexa import persistence  # noqa: E402
+from alexa.attributes import REQUEST_ATTRIBUTE_KEY, PARTITION_KEY_NAME, ATTRIBUTE_NAME, \
+    user_attributes_cache  # noqa: E402
+from intent_handlers.base_handlers import BaseRequestHandler  # noqa: E402
+
+TABLE_NAME = "users"
+
+
+def make_handler_input(user_id):
+    """ The parts of a HandlerInput used by the user attributes """
+    envelope = SimpleNamespace(context=SimpleNamespace(system=SimpleNamespace(user=SimpleNamespace(user_id=user_id))))
+    return SimpleNamespace(request_envelope=envelope, attributes_manager=SimpleNamespace(request_attributes={}))
+
+
+def end_request(handler_input):
+    """ What the SaveUserAttributesInterceptor does at the end of the request """
+    handler_input.attributes_manager.request_attributes[REQUEST_ATTRIBUTE_KEY].commit()
+
+
+class NewUserAttributesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.table_name = persistence.USER_TABLE_NAME
+        persistence.USER_TABLE_NAME = TABLE_NAME
+        self.dynamodb = FakeDynamoDbResource()
+        persistence.set_dynamodb_resource(self.dynamodb)
+        user_attributes_cache.clear()
+        self.handler = BaseRequestHandler()
+
+    def tearDown(self):
+        persistence.USER_TABLE_NAME = self.table_name
+        user_attributes_cache.clear()
+
+    def stored(self, user_id):
+        return self.dynamodb.Table(TABLE_NAME).get_item(Key={PARTITION_KEY_NAME: user_id})["Item"][ATTRIBUTE_NAME]
+
+    def test_defaults_applied_once_per_request(self):
+        handler_input = make_handler_input("new-user")
+        first = self.handler.get_attributes(handler_input)
+        self.assertTrue(first["first_use"])
+        self.handler.set_attributes(handler_input, {"custom_attr": "changed"})
+
+        second = self.handler.get_attributes(handler_input)
+        self.assertEqual(second["custom_attr"], "changed")
+        self.assertNotIn("first_use", second)
+
+        end_request(handler_input)
+        self.assertEqual(self.stored("new-user"), {"custom_attr": "changed"})
+
+    def test_saved_user_is_not_new_in_next_request(self):
+        handler_input = make_handler_input("returning-user")
+        self.handler.get_attributes(handler_input)
+        end_request(handler_input)
+
+        user_attributes_cache.clear()  # next request on another container
+        attributes = self.handler.get_attributes(make_handler_input("returning-user"))
+        self.assertEqual(attributes, {"custom_attr": "TODO"})
+
+
+if __name__ == '__main__':
+    unittest.main()